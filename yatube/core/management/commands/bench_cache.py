@@ -0,0 +1,66 @@
+import shutil
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache import SQLiteCache
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает SQLiteCache с LocMemCache и FileBasedCache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keys', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        try:
+            backends = {
+                'locmem': LocMemCache('bench', {
+                    'OPTIONS': {'MAX_ENTRIES': 10 ** 6}
+                }),
+                'filebased': FileBasedCache(f'{directory}/files', {
+                    'OPTIONS': {'MAX_ENTRIES': 10 ** 6}
+                }),
+                'sqlite': SQLiteCache(f'{directory}/cache.sqlite3', {
+                    'OPTIONS': {'MAX_ENTRIES': 10 ** 6}
+                }),
+            }
+            self.stdout.write(
+                f'{"бэкенд":<10} {"set":>9} {"get":>9} '
+                f'{"get_many":>9} {"incr":>9}   (мкс на ключ)'
+            )
+            for name, cache in backends.items():
+                self.stdout.write(
+                    f'{name:<10} '
+                    + ' '.join(
+                        f'{value:9.1f}'
+                        for value in self.measure(cache, options['keys'])
+                    )
+                )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def measure(self, cache, count):
+        keys = [f'bench:{i}' for i in range(count)]
+        value = {'html': 'x' * 2000}
+
+        def per_key(func):
+            start = time.perf_counter()
+            func()
+            return (time.perf_counter() - start) / count * 10 ** 6
+
+        set_time = per_key(lambda: [cache.set(key, value) for key in keys])
+        get_time = per_key(lambda: [cache.get(key) for key in keys])
+        many_time = per_key(lambda: [
+            cache.get_many(keys[start:start + 10])
+            for start in range(0, count, 10)
+        ])
+        cache.set('counter', 0)
+        incr_time = per_key(
+            lambda: [cache.incr('counter') for _ in range(count)]
+        )
+        return set_time, get_time, many_time, incr_time
@@ -0,0 +1,214 @@
+"""Keyset-пагинация (по курсору).
+
+Страница выбирается условием на поля сортировки последнего
+показанного объекта, а не OFFSET, и без COUNT(*) по всей выборке,
+поэтому стоимость любой страницы одинакова.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+NEXT = 'n'
+PREVIOUS = 'p'
+LAST = 'l'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _dump(value):
+    if isinstance(value, datetime.datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _load(value):
+    if isinstance(value, dict):
+        return parse_datetime(value['dt'])
+    return value
+
+
+def encode_cursor(direction, values=()):
+    data = json.dumps([direction, [_dump(value) for value in values]])
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError, binascii.Error):
+        raise InvalidCursor(cursor)
+    if direction not in (NEXT, PREVIOUS, LAST) or not isinstance(
+        values, list
+    ):
+        raise InvalidCursor(cursor)
+    return direction, [_load(value) for value in values]
+
+
+class CursorPage(Page):
+    def __init__(self, object_list, paginator, number=None,
+                 has_next=False, has_previous=False):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<Page {self.number or "cursor"}>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def next_page_number(self):
+        return self.number + 1 if self.number else None
+
+    def previous_page_number(self):
+        return self.number - 1 if self.number else None
+
+    @cached_property
+    def next_cursor(self):
+        if not self.has_next() or not self.object_list:
+            return None
+        return self.paginator.cursor_for(NEXT, self.object_list[-1])
+
+    @cached_property
+    def previous_cursor(self):
+        if not self.has_previous() or not self.object_list:
+            return None
+        return self.paginator.cursor_for(PREVIOUS, self.object_list[0])
+
+    @property
+    def last_cursor(self):
+        return encode_cursor(LAST)
+
+
+class CursorPaginator(Paginator):
+    '''Paginator, который листает выборку по курсору.
+
+    Порядок берется из order_by выборки (или Meta.ordering модели)
+    и дополняется первичным ключом, чтобы быть строгим, если в нем
+    еще нет уникального поля из unique_keys.
+    Старые ссылки вида ?page=N по-прежнему работают через OFFSET,
+    но тоже без подсчета общего количества объектов.
+    '''
+
+    def __init__(self, object_list, per_page, ordering=None,
+                 unique_keys=('pk', 'id'), **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.unique_keys = unique_keys
+        self.ordering = self._keyset_ordering(ordering)
+
+    def _keyset_ordering(self, ordering):
+        if ordering is None:
+            ordering = (
+                self.object_list.query.order_by
+                or self.object_list.model._meta.ordering
+            )
+        ordering = list(ordering)
+        if not any(key.lstrip('-') in self.unique_keys for key in ordering):
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append('-pk' if descending else 'pk')
+        return tuple(ordering)
+
+    @staticmethod
+    def _attname(key):
+        return key.lstrip('-')
+
+    def _key_value(self, obj, key):
+        name = self._attname(key)
+        # строки values() — словари, pk в них называется по полю
+        if isinstance(obj, dict):
+            if name == 'pk':
+                name = self.object_list.model._meta.pk.attname
+            return obj[name]
+        return getattr(obj, name)
+
+    def cursor_for(self, direction, obj):
+        return encode_cursor(direction, [
+            self._key_value(obj, key) for key in self.ordering
+        ])
+
+    def _seek(self, values, forward):
+        '''Условие "строго после values" в порядке self.ordering'''
+        condition = None
+        for key, value in reversed(list(zip(self.ordering, values))):
+            name = self._attname(key)
+            less = key.startswith('-') == forward
+            step = Q(**{f'{name}__{"lt" if less else "gt"}': value})
+            if condition is not None:
+                step |= Q(**{name: value}) & condition
+            condition = step
+        # нестрогая граница по первому полю позволяет
+        # читать диапазон индекса, а не всю таблицу
+        name = self._attname(self.ordering[0])
+        less = self.ordering[0].startswith('-') == forward
+        bound = Q(**{f'{name}__{"lte" if less else "gte"}': values[0]})
+        return bound & condition
+
+    @staticmethod
+    def _reverse(ordering):
+        return [
+            key[1:] if key.startswith('-') else f'-{key}' for key in ordering
+        ]
+
+    def _window(self, queryset):
+        rows = list(queryset[:self.per_page + 1])
+        return rows[:self.per_page], len(rows) > self.per_page
+
+    def page_by_cursor(self, cursor):
+        direction, values = decode_cursor(cursor)
+        queryset = self.object_list
+        if direction == LAST:
+            rows, more = self._window(
+                queryset.order_by(*self._reverse(self.ordering))
+            )
+            return CursorPage(rows[::-1], self, has_previous=more)
+        if len(values) != len(self.ordering):
+            raise InvalidCursor(cursor)
+        if direction == NEXT:
+            rows, more = self._window(
+                queryset.filter(self._seek(values, True))
+                .order_by(*self.ordering)
+            )
+            return CursorPage(rows, self, has_next=more, has_previous=True)
+        rows, more = self._window(
+            queryset.filter(self._seek(values, False))
+            .order_by(*self._reverse(self.ordering))
+        )
+        return CursorPage(rows[::-1], self, has_next=True, has_previous=more)
+
+    def page_by_number(self, number):
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        offset = (number - 1) * self.per_page
+        rows, more = self._window(
+            self.object_list.order_by(*self.ordering)[offset:]
+        )
+        if not rows and number > 1:
+            # как Paginator.get_page: номер за концом — последняя страница
+            return self.page_by_cursor(encode_cursor(LAST))
+        return CursorPage(
+            rows, self, number, has_next=more, has_previous=number > 1
+        )
+
+    def get_page(self, number=None, cursor=None):
+        if cursor:
+            try:
+                return self.page_by_cursor(cursor)
+            except (ValueError, ValidationError):
+                pass
+        return self.page_by_number(number)
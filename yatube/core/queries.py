@@ -0,0 +1,137 @@
+"""Бюджет SQL-запросов на view и поиск N+1.
+
+QueryBudgetMiddleware записывает все запросы каждого HTTP-запроса,
+группирует их по форме (литералы и списки параметров заменяются
+на ?) и сравнивает с бюджетом из settings.QUERY_BUDGETS для имени URL.
+При QUERY_BUDGET_STRICT = True нарушения превращаются в исключение,
+иначе только пишутся в лог. В тестах строгий режим включает
+QueryBudgetRunner (settings.TEST_RUNNER) для всего прогона.
+"""
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+logger = logging.getLogger(__name__)
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER = re.compile(r'%s|\?')
+VALUES_LIST = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+SPACES = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def normalize(sql):
+    '''Форма запроса: одинаковая для запросов, отличающихся параметрами'''
+    sql = STRING.sub('?', sql)
+    sql = NUMBER.sub('?', sql)
+    sql = PLACEHOLDER.sub('?', sql)
+    sql = VALUES_LIST.sub('(...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    '''Записывает SQL всех подключений внутри блока with'''
+
+    def __init__(self):
+        self.statements = []
+        self.params = []
+        self._contexts = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.statements.append(sql)
+        self.params.append(params)
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        for connection in connections.all():
+            wrapper = connection.execute_wrapper(self)
+            wrapper.__enter__()
+            self._contexts.append(wrapper)
+        return self
+
+    def __exit__(self, *exc_info):
+        while self._contexts:
+            self._contexts.pop().__exit__(*exc_info)
+
+    def __len__(self):
+        return len(self.statements)
+
+    def repeated(self, threshold=None):
+        '''Формы запросов, повторившиеся не меньше threshold раз'''
+        if threshold is None:
+            threshold = getattr(settings, 'QUERY_N_PLUS_ONE_THRESHOLD', 5)
+        shapes = Counter(normalize(sql) for sql in self.statements)
+        return [
+            (shape, count) for shape, count in shapes.most_common()
+            if count >= threshold
+        ]
+
+
+def check_budget(recorder, view_name):
+    '''Список нарушений бюджета и N+1 для view_name'''
+    problems = []
+    budget = getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+    if budget is not None and len(recorder) > budget:
+        problems.append(
+            f'{view_name}: {len(recorder)} запросов при бюджете {budget}'
+        )
+    for shape, count in recorder.repeated():
+        problems.append(f'{view_name}: N+1, {count} раз: {shape}')
+    return problems
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        match = request.resolver_match
+        if match is None:
+            return response
+        problems = check_budget(recorder, match.view_name)
+        if problems:
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded('\n'.join(problems))
+            for problem in problems:
+                logger.warning(problem)
+        return response
+
+
+class QueryBudgetRunner(DiscoverRunner):
+    '''Тестовый раннер: бюджеты запросов проверяются строго везде'''
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._strict = override_settings(QUERY_BUDGET_STRICT=True)
+        self._strict.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._strict.disable()
+        super().teardown_test_environment(**kwargs)
+
+
+class QueryBudgetMixin:
+    '''Для TestCase: проверка числа запросов внутри блока with'''
+
+    @contextmanager
+    def assertMaxQueries(self, limit):
+        with QueryRecorder() as recorder:
+            yield recorder
+        if len(recorder) > limit:
+            self.fail(
+                f'{len(recorder)} запросов при лимите {limit}:\n'
+                + '\n'.join(recorder.statements)
+            )
@@ -0,0 +1,54 @@
+"""Хранилище, в котором имя файла — хэш его содержимого.
+
+Файл сохраняется как <каталог>/ab/cd/abcd…<sha256>.<расширение>:
+одинаковые загрузки получают одно имя и делят один файл (и один набор
+миниатюр), а два уровня каталогов не дают им разрастись.
+Файл может понадобиться нескольким объектам, поэтому хранилище
+никогда не удаляет его само; лишние файлы убирает команда очистки
+после проверки ссылок и только если файл давно не сохранялся.
+"""
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks(CHUNK_SIZE):
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def hashed_name(self, name, content):
+        '''Имя файла по содержимому, каталог из name сохраняется'''
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = content_hash(content)
+        return os.path.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        ).replace('\\', '/')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # свежее время изменения защищает файл от очистки,
+            # пока ссылка на него еще не сохранена в базе
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length=max_length)
@@ -1,4 +1,14 @@
-from django.test import TestCase
+import multiprocessing
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.cache import SQLiteCache
+from core.queries import QueryRecorder, normalize
 
 
 class TestCustomErrorPages(TestCase):
@@ -7,3 +17,164 @@ class TestCustomErrorPages(TestCase):
         url_invalid = '/some_invalid_url_404/'
         response = self.client.get(url_invalid)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+def _increment(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    '''Контракт бэкенда кэша Django для SQLiteCache'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = f'{self.directory}/cache.sqlite3'
+        settings = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'core.cache.SQLiteCache',
+                'LOCATION': self.location,
+                'OPTIONS': {'MAX_ENTRIES': 30, 'CULL_FREQUENCY': 3},
+            }
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.cache = caches['default']
+
+    def test_simple(self):
+        self.cache.set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertIsNone(self.cache.get('missing'))
+        self.assertEqual(self.cache.get('missing', 'default'), 'default')
+
+    def test_data_types(self):
+        data = {
+            'string': 'строка',
+            'int': 42,
+            'list': [1, 2, 3],
+            'dict': {'a': 1},
+            'bytes': b'\x00\x01',
+            'none': None,
+        }
+        for key, value in data.items():
+            with self.subTest(key=key):
+                self.cache.set(key, value)
+                self.assertEqual(self.cache.get(key, 'default'), value)
+
+    def test_add(self):
+        self.assertTrue(self.cache.add('key', 'first'))
+        self.assertFalse(self.cache.add('key', 'second'))
+        self.assertEqual(self.cache.get('key'), 'first')
+
+    def test_get_set_many(self):
+        self.assertEqual(self.cache.set_many({'a': 1, 'b': 2}), [])
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        self.cache.delete_many(['a', 'b'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+    def test_delete_and_has_key(self):
+        self.cache.set('key', 'value')
+        self.assertTrue(self.cache.has_key('key'))
+        self.cache.delete('key')
+        self.assertFalse(self.cache.has_key('key'))
+        self.assertNotIn('key', self.cache)
+
+    def test_incr_decr(self):
+        self.cache.set('answer', 41)
+        self.assertEqual(self.cache.incr('answer'), 42)
+        self.assertEqual(self.cache.incr('answer', 10), 52)
+        self.assertEqual(self.cache.decr('answer', 12), 40)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_expiration(self):
+        self.cache.set('expired', 'value', 1)
+        self.cache.add('expired_add', 'value', 1)
+        time.sleep(1.1)
+        self.assertIsNone(self.cache.get('expired'))
+        self.assertFalse(self.cache.has_key('expired'))
+        self.assertTrue(self.cache.add('expired_add', 'new'))
+        self.assertEqual(self.cache.get('expired_add'), 'new')
+
+    def test_zero_and_forever_timeout(self):
+        self.cache.set('zero', 'value', 0)
+        self.assertIsNone(self.cache.get('zero'))
+        self.cache.set('forever', 'value', None)
+        self.assertEqual(self.cache.get('forever'), 'value')
+
+    def test_touch(self):
+        self.cache.set('key', 'value', 1)
+        self.assertTrue(self.cache.touch('key', None))
+        time.sleep(1.1)
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertFalse(self.cache.touch('missing'))
+
+    def test_versions(self):
+        self.cache.set('key', 'v1', version=1)
+        self.cache.set('key', 'v2', version=2)
+        self.assertEqual(self.cache.get('key', version=1), 'v1')
+        self.assertEqual(self.cache.get('key', version=2), 'v2')
+        self.cache.incr_version('key', version=2)
+        self.assertEqual(self.cache.get('key', version=3), 'v2')
+
+    def test_get_or_set(self):
+        self.assertEqual(
+            self.cache.get_or_set('key', lambda: 'value'), 'value')
+        self.assertEqual(self.cache.get_or_set('key', 'other'), 'value')
+
+    def test_clear(self):
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.cache.clear()
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+    def test_cull(self):
+        for i in range(50):
+            self.cache.set(f'cull{i}', i)
+        stored = self.cache.get_many(f'cull{i}' for i in range(50))
+        self.assertLessEqual(len(stored), 31)
+        self.assertIn('cull49', stored)
+
+    def test_shared_between_processes(self):
+        '''Процессы видят общие данные, incr атомарен'''
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=_increment, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+
+class QueryRecorderTests(TestCase):
+
+    def test_normalize(self):
+        self.assertEqual(
+            normalize("SELECT * FROM t WHERE id = 15 AND name = 'x'"),
+            normalize("SELECT * FROM t WHERE id = 7 AND name = 'y'")
+        )
+        self.assertEqual(
+            normalize('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+            'SELECT * FROM t WHERE id IN (...)'
+        )
+
+    def test_repeated_statements(self):
+        from django.contrib.auth import get_user_model
+        User = get_user_model()
+        users = [User.objects.create(username=f'user{i}') for i in range(5)]
+        with QueryRecorder() as recorder:
+            for user in users:
+                User.objects.get(pk=user.pk)
+        self.assertEqual(len(recorder), 5)
+        self.assertEqual(len(recorder.repeated(threshold=5)), 1)
+        self.assertEqual(recorder.repeated(threshold=6), [])
+
+    def test_strict_budget_in_tests(self):
+        '''QueryBudgetRunner включает строгие бюджеты на весь прогон'''
+        self.assertTrue(settings.QUERY_BUDGET_STRICT)
@@ -0,0 +1,31 @@
+"""Загрузка файлов с ограничением размера.
+
+LimitedUploadHandler пишет тело файла во временный файл кусками
+и перестает писать, как только превышен FILE_UPLOAD_MAX_SIZE.
+Загрузка при этом дочитывается, но файл помечается truncated,
+и форма отклоняет его, не пытаясь декодировать.
+
+    FILE_UPLOAD_HANDLERS = ['core.uploads.LimitedUploadHandler']
+"""
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+def max_upload_size():
+    return getattr(settings, 'FILE_UPLOAD_MAX_SIZE', 10 * 1024 * 1024)
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received <= max_upload_size():
+            self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.truncated = file_size > max_upload_size()
+        return file
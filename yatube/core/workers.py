@@ -0,0 +1,22 @@
+"""Пул процессов для фоновых задач Django.
+
+Процессы запускаются через spawn: fork унаследовал бы открытые
+соединения с базой и кэшем. Модуль не импортирует моделей, потому что
+дочерний процесс загружает его до django.setup().
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+
+
+def setup_worker():
+    django.setup()
+
+
+def process_pool(workers):
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=setup_worker,
+    )
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from posts import search
 from posts.models import Post, Group
 
 
@@ -22,6 +23,14 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)  # возможность фильтрации по дате
     empty_value_display = '-пусто-'  # где пусто — там будет эта строка
 
+    def get_search_results(self, request, queryset, search_term):
+        '''Поиск по полнотекстовому индексу вместо LIKE по всей таблице'''
+        if not search_term or not search.available():
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return search.filter_matching(queryset, search_term), False
+
 
 # регистрация моделей
 admin.site.register(Post, PostAdmin)
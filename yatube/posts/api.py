@@ -0,0 +1,173 @@
+"""JSON API только для чтения: ленты, посты и комментарии.
+
+Ответы собираются из values() — без создания объектов моделей
+и без шаблонов, ленты листаются по курсору (core.paginator).
+Страницы главной ленты и групп кэшируются вместе с HTML-версиями
+(posts.page_cache) и сбрасываются теми же сигналами.
+"""
+from django.conf import settings
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+
+from core.paginator import CursorPaginator
+from posts.feed import FEED_UNIQUE_KEYS, follow_feed
+from posts.models import Comment, Group, Post, User
+from posts.page_cache import cache_feed
+
+
+# имя в ответе -> поле для values()
+POST_FIELDS = (
+    ('id', 'id'),
+    ('text', 'text'),
+    ('pub_date', 'pub_date'),
+    ('author', 'author__username'),
+    ('group', 'group__slug'),
+    ('image', 'image'),
+    ('comments_count', 'comments_count'),
+)
+COMMENT_FIELDS = (
+    ('id', 'id'),
+    ('post', 'post_id'),
+    ('author', 'author__username'),
+    ('text', 'text'),
+    ('created', 'created'),
+)
+GROUP_FIELDS = ('id', 'title', 'slug', 'description', 'posts_count')
+
+
+def page_size():
+    return getattr(settings, 'API_PAGE_SIZE', 10)
+
+
+def max_page_size():
+    return getattr(settings, 'API_MAX_PAGE_SIZE', 50)
+
+
+def batch_limit():
+    return getattr(settings, 'API_BATCH_LIMIT', 100)
+
+
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _response(data):
+    return JsonResponse(data, json_dumps_params={'ensure_ascii': False})
+
+
+def _values(queryset, fields, *extra):
+    return queryset.values(*(source for name, source in fields), *extra)
+
+
+def _serialize(row, fields):
+    data = {name: row[source] for name, source in fields}
+    if data.get('image'):
+        data['image'] = settings.MEDIA_URL + data['image']
+    return data
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', page_size()))
+    except ValueError:
+        limit = page_size()
+    return min(max(limit, 1), max_page_size())
+
+
+def _page(request, rows, fields, **options):
+    '''Страница по курсору ?cursor= в виде словаря для ответа'''
+    page = CursorPaginator(rows, _limit(request), **options).get_page(
+        request.GET.get('page'), request.GET.get('cursor')
+    )
+    return _response({
+        'results': [_serialize(row, fields) for row in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+
+
+def _posts():
+    return _values(Post.objects.all(), POST_FIELDS)
+
+
+@cache_feed('index', shared=True)
+def index(request):
+    '''Главная лента'''
+    return _page(request, _posts(), POST_FIELDS)
+
+
+@cache_feed('group:{slug}', shared=True)
+def group_posts(request, slug):
+    '''Лента группы'''
+    group = get_object_or_404(Group, slug=slug)
+    return _page(request, _posts().filter(group=group), POST_FIELDS)
+
+
+def profile_posts(request, username):
+    '''Лента автора'''
+    author = get_object_or_404(User, username=username)
+    return _page(request, _posts().filter(author=author), POST_FIELDS)
+
+
+def follow_index(request):
+    '''Лента подписок вошедшего пользователя'''
+    if not request.user.is_authenticated:
+        return _error('Нужна авторизация', status=401)
+    posts = follow_feed(request.user)
+    # ключи курсора ленты подписок тоже должны попасть в строки
+    extra = [
+        name for name in ('feed_date', 'feed_post')
+        if name in posts.query.annotations
+    ]
+    return _page(
+        request, _values(posts, POST_FIELDS, *extra), POST_FIELDS,
+        unique_keys=FEED_UNIQUE_KEYS
+    )
+
+
+def post_detail(request, post_id):
+    '''Пост по id'''
+    row = _posts().filter(pk=post_id).first()
+    if row is None:
+        return _error('Пост не найден', status=404)
+    return _response(_serialize(row, POST_FIELDS))
+
+
+def post_batch(request):
+    '''Несколько постов по ?ids=1,2,3 одним запросом к базе
+       Порядок ответа совпадает с порядком ids,
+       отсутствующие id перечислены в missing'''
+    try:
+        ids = list(dict.fromkeys(
+            int(value) for value in request.GET.get('ids', '').split(',')
+            if value.strip()
+        ))
+    except ValueError:
+        return _error('ids — список целых чисел через запятую')
+    if len(ids) > batch_limit():
+        return _error(f'Не больше {batch_limit()} id за запрос')
+    rows = {row['id']: row for row in _posts().filter(pk__in=ids)}
+    return _response({
+        'results': [
+            _serialize(rows[pk], POST_FIELDS) for pk in ids if pk in rows
+        ],
+        'missing': [pk for pk in ids if pk not in rows],
+    })
+
+
+def post_comments(request, post_id):
+    '''Комментарии поста, от новых к старым'''
+    if not Post.objects.filter(pk=post_id).exists():
+        return _error('Пост не найден', status=404)
+    comments = _values(
+        Comment.objects.filter(post_id=post_id), COMMENT_FIELDS
+    )
+    return _page(request, comments, COMMENT_FIELDS)
+
+
+def group_detail(request, slug):
+    '''Описание группы'''
+    row = Group.objects.filter(slug=slug).values(*GROUP_FIELDS).first()
+    if row is None:
+        return _error('Группа не найдена', status=404)
+    return _response(row)
@@ -0,0 +1,52 @@
+"""Общее для массовой загрузки в обход сигналов.
+
+generate_data и bulk_import вставляют строки через bulk_create:
+сигналы не отправляются, даты auto_now_add берутся из данных,
+а в конце finish() делает то, что сделали бы сигналы.
+"""
+from contextlib import contextmanager
+
+from posts import (
+    counters, feed, follow_graph, page_cache, suggestions, trending,
+)
+from posts.signals import bump_group_pages
+
+
+@contextmanager
+def explicit_dates(*fields):
+    '''Позволяет bulk_create записать свои даты в поля auto_now_add'''
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _call(label, func, *args):
+    return func(*args)
+
+
+def finish(group_ids=(), author_ids=(), follower_ids=(), rebuild_feeds=True,
+           recompute_suggestions=False, step=_call):
+    '''То, что при обычном сохранении сделали бы сигналы.
+
+    Пересчитывает счетчики, популярные посты и ленты, отмечает
+    рекомендации читателей follower_ids устаревшими и сбрасывает
+    закэшированные страницы: главную, группы group_ids и профили
+    author_ids. step(label, func, *args) позволяет замерить шаги.
+    '''
+    step('Счетчики', lambda: sum(counters.reconcile().values()))
+    follow_graph.reset()
+    step('Популярные посты', trending.compact)
+    if rebuild_feeds:
+        step('Ленты подписок', feed.rebuild)
+    suggestions.mark_stale(*follower_ids)
+    if recompute_suggestions:
+        step('Рекомендации', suggestions.recompute)
+    page_cache.bump('index')
+    bump_group_pages(*group_ids)
+    page_cache.bump_many(
+        page_cache.author_scope(author_id) for author_id in author_ids
+    )
@@ -0,0 +1,123 @@
+"""Кэш HTML-карточек постов в лентах.
+
+Ключ карточки включает версию поста, его автора и группы.
+Версии живут в кэше и меняются из сигналов при сохранении поста,
+пользователя или группы, поэтому устаревшие карточки просто
+перестают читаться и вытесняются кэшем сами.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+STATS_KEYS = {'hits': 'card:stats:hits', 'misses': 'card:stats:misses'}
+
+
+def card_timeout():
+    return getattr(settings, 'POST_CARD_TIMEOUT', 60 * 60 * 24)
+
+
+def _version_key(kind, pk):
+    return f'card:v:{kind}:{pk}'
+
+
+def bump(kind, pk):
+    '''Меняет версию поста, автора или группы'''
+    cache.set(_version_key(kind, pk), uuid.uuid4().hex[:8], None)
+
+
+def _version_keys(post):
+    keys = [
+        _version_key('post', post.pk),
+        _version_key('user', post.author_id),
+    ]
+    if post.group_id:
+        keys.append(_version_key('group', post.group_id))
+    return keys
+
+
+def _versions(posts):
+    '''Версии для всех постов страницы одним get_many'''
+    keys = {key for post in posts for key in _version_keys(post)}
+    versions = cache.get_many(keys)
+    missing = {
+        key: uuid.uuid4().hex[:8] for key in keys if key not in versions
+    }
+    for key, value in missing.items():
+        # версия могла появиться в другом процессе, add ее не затрет
+        if not cache.add(key, value, None):
+            value = cache.get(key, value)
+        versions[key] = value
+    return versions
+
+
+def post_versions(post):
+    '''Версии поста, его автора и группы'''
+    versions = _versions([post])
+    return [versions[key] for key in _version_keys(post)]
+
+
+def card_key(post, versions):
+    version = '.'.join(versions[key] for key in _version_keys(post))
+    return f'card:{post.pk}:{version}'
+
+
+def render_cards(posts):
+    '''HTML карточек для постов страницы: {pk: html}.
+
+    Версии и готовые карточки читаются двумя get_many на всю страницу,
+    отрисовываются только промахи.
+    '''
+    posts = list(posts)
+    if not posts:
+        return {}
+    versions = _versions(posts)
+    keys = {post.pk: card_key(post, versions) for post in posts}
+    cached = cache.get_many(keys.values())
+    cards = {}
+    rendered = {}
+    template = None
+    misses = [post for post in posts if keys[post.pk] not in cached]
+    thumbnails = {}
+    for post in posts:
+        html = cached.get(keys[post.pk])
+        if html is None:
+            template = template or get_template(CARD_TEMPLATE)
+            # миниатюры всех промахов читаются вместе, см. post_thumbnail
+            html = template.render({
+                'post': post,
+                'thumbnail_posts': misses,
+                'post_thumbnails': thumbnails,
+            })
+            rendered[keys[post.pk]] = html
+        cards[post.pk] = html
+    if rendered:
+        cache.set_many(rendered, card_timeout())
+    _count(hits=len(posts) - len(rendered), misses=len(rendered))
+    return cards
+
+
+def _count(**values):
+    for name, value in values.items():
+        if not value:
+            continue
+        try:
+            cache.incr(STATS_KEYS[name], value)
+        except ValueError:
+            cache.add(STATS_KEYS[name], 0, None)
+            cache.incr(STATS_KEYS[name], value)
+
+
+def stats():
+    '''Счетчики попаданий и промахов кэша карточек'''
+    values = cache.get_many(STATS_KEYS.values())
+    return {
+        name: values.get(key, 0) for name, key in STATS_KEYS.items()
+    }
+
+
+def reset_stats():
+    cache.delete_many(STATS_KEYS.values())
@@ -0,0 +1,152 @@
+"""Условные GET-запросы (ETag / Last-Modified) для лент и поста.
+
+Валидатор страницы считается до отрисовки из дешевых источников:
+поколений лент из posts.page_cache, версий карточек из posts.cards
+и денормализованных счетчиков. Если клиент прислал тот же ETag
+(или страница не менялась с If-Modified-Since), view не вызывается
+и ответ 304 уходит без шаблонов.
+
+В ETag входит состояние входа: анонимный посетитель, пользователь
+и его CSRF-cookie (после нового входа токен в формах другой).
+Last-Modified отдается только анонимам: для вошедших у одной и той же
+страницы разные версии, различить их может только ETag.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from posts import cards, page_cache
+from posts.models import Post, User
+
+
+def viewer_key(request):
+    if not request.user.is_authenticated:
+        return 'anon'
+    csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    return f'{request.user.pk}:{csrf}'
+
+
+def make_etag(request, *parts):
+    '''ETag страницы: адрес, состояние входа и версии данных'''
+    data = '|'.join(
+        str(part) for part in (request.get_full_path(), viewer_key(request))
+        + parts
+    )
+    return hashlib.md5(data.encode()).hexdigest()
+
+
+def _viewer_follows(request):
+    if not request.user.is_authenticated:
+        return ''
+    return page_cache.generation(page_cache.follows_scope(request.user.pk))
+
+
+def _anonymous(last_modified):
+    @wraps(last_modified)
+    def wrapper(request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return None
+        return last_modified(request, *args, **kwargs)
+    return wrapper
+
+
+def conditional_page(etag_func, last_modified_func=None):
+    '''Отвечает 304 по валидаторам и просит клиента всегда их проверять'''
+    def decorator(view):
+        conditional = condition(
+            etag_func=etag_func,
+            last_modified_func=(
+                _anonymous(last_modified_func) if last_modified_func
+                else None
+            ),
+        )(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            # без no-cache браузер мог бы показывать копию без проверки
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def feed_etag(scope):
+    '''ETag ленты с кэшем страниц: поколение ленты и вход'''
+    def etag(request, *args, **kwargs):
+        return make_etag(
+            request, page_cache.generation(scope.format(**kwargs))
+        )
+    return etag
+
+
+def feed_last_modified(scope):
+    def last_modified(request, *args, **kwargs):
+        return page_cache.changed_at(scope.format(**kwargs))
+    return last_modified
+
+
+def author_id(request, username):
+    '''id автора по имени; запоминается в request на весь запрос'''
+    if not hasattr(request, '_conditional_author_id'):
+        request._conditional_author_id = User.objects.filter(
+            username=username
+        ).values_list('pk', flat=True).first()
+    return request._conditional_author_id
+
+
+def profile_etag(request, username):
+    '''Посты и имя автора, а для читателя — еще и его подписки'''
+    author = author_id(request, username)
+    if author is None:
+        return None
+    return make_etag(
+        request,
+        page_cache.generation(page_cache.author_scope(author)),
+        _viewer_follows(request),
+    )
+
+
+def profile_scope(request, username):
+    '''Лента автора для кэша страниц профиля'''
+    author = author_id(request, username)
+    if author is None:
+        return None
+    return page_cache.author_scope(author)
+
+
+def profile_last_modified(request, username):
+    author = author_id(request, username)
+    if author is None:
+        return None
+    return page_cache.changed_at(page_cache.author_scope(author))
+
+
+def post_detail_etag(request, post_id):
+    '''Версии карточки поста (текст, автор, группа) и счетчики'''
+    row = Post.objects.filter(pk=post_id).values(
+        'author', 'group', 'comments_count',
+        'author__post_counter__posts_count',
+    ).first()
+    if row is None:
+        return None
+    post = Post(pk=post_id, author_id=row['author'], group_id=row['group'])
+    return make_etag(
+        request,
+        *cards.post_versions(post),
+        row['comments_count'],
+        row['author__post_counter__posts_count'],
+    )
+
+
+def post_comments_etag(request, post_id):
+    '''Страница комментариев меняется вместе с их числом'''
+    count = Post.objects.filter(pk=post_id).values_list(
+        'comments_count', flat=True
+    ).first()
+    if count is None:
+        return None
+    return make_etag(request, count)
@@ -0,0 +1,105 @@
+"""Денормализованные счетчики постов и комментариев.
+
+Счетчики меняются атомарным UPDATE ... SET x = x + 1 (F-выражения)
+из сигналов, а reconcile() пересчитывает их с нуля, если они разошлись.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from posts.models import AuthorCounter, Comment, Group, Post, User
+
+
+def _shift(queryset, field, delta):
+    if delta > 0:
+        value = F(field) + delta
+    else:
+        # счетчики беззнаковые, поэтому не уходим ниже нуля
+        value = Greatest(F(field) + delta, 0)
+    return queryset.update(**{field: value})
+
+
+def change_author_posts(author_id, delta):
+    updated = _shift(
+        AuthorCounter.objects.filter(author_id=author_id),
+        'posts_count', delta
+    )
+    if not updated and delta > 0:
+        AuthorCounter.objects.get_or_create(author_id=author_id)
+        _shift(
+            AuthorCounter.objects.filter(author_id=author_id),
+            'posts_count', delta
+        )
+
+
+def change_group_posts(group_id, delta):
+    if group_id is not None:
+        _shift(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def change_post_comments(post_id, delta):
+    _shift(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def author_posts_count(author):
+    '''Количество постов автора без COUNT по таблице постов'''
+    try:
+        return author.post_counter.posts_count
+    except AuthorCounter.DoesNotExist:
+        return 0
+
+
+def _actual(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def _repair(queryset, field, actual):
+    drifted = queryset.annotate(actual=actual).filter(
+        ~Q(**{field: F('actual')})
+    )
+    fixed = drifted.count()
+    if fixed:
+        queryset.update(**{field: actual})
+    return fixed
+
+
+def reconcile():
+    '''Пересчитывает все счетчики, возвращает количество исправленных строк'''
+    missing = User.objects.filter(
+        posts__isnull=False, post_counter__isnull=True
+    ).distinct().values_list('pk', flat=True)
+    AuthorCounter.objects.bulk_create(
+        [AuthorCounter(author_id=pk) for pk in missing],
+        ignore_conflicts=True
+    )
+    author_posts = Coalesce(
+        Subquery(
+            Post.objects.filter(author=OuterRef('author'))
+            .order_by()
+            .values('author')
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+    return {
+        'authors': _repair(
+            AuthorCounter.objects.all(), 'posts_count', author_posts
+        ),
+        'groups': _repair(
+            Group.objects.all(), 'posts_count', _actual(Post, 'group')
+        ),
+        'posts': _repair(
+            Post.objects.all(), 'comments_count', _actual(Comment, 'post')
+        ),
+    }
@@ -0,0 +1,260 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Пост раскладывается по лентам подписчиков в момент публикации,
+подписка добавляет в ленту посты автора, отписка — убирает их.
+Авторы, у которых подписчиков больше FEED_FANOUT_LIMIT, по лентам
+не раскладываются: их посты подмешиваются при чтении (гибридный режим).
+Когда автор опускается до порога, ленты всех его подписчиков
+дописываются его постами. После смены FEED_FANOUT_LIMIT ленты
+пересобирает команда backfill_feed.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Q
+
+from posts import follow_graph, page_cache
+from posts.models import FeedItem, Follow, Post
+
+
+FEED_BATCH_SIZE = 1000
+CELEBRITIES_KEY = 'feed:celebrities'
+# пост входит в ленту пользователя один раз, так что feed_post
+# делает порядок ленты строгим без id поста
+FEED_UNIQUE_KEYS = ('feed_post', 'pk', 'id')
+# общее поколение всех закэшированных лент подписок: для пересборки
+FEEDS_SCOPE = 'feeds'
+
+
+def fanout_limit():
+    return getattr(settings, 'FEED_FANOUT_LIMIT', 1000)
+
+
+def celebrities_key():
+    return f'{CELEBRITIES_KEY}:{fanout_limit()}'
+
+
+def celebrities():
+    '''id авторов, чьи посты не раскладываются по лентам.
+
+    Множество собирается одним запросом, только если его нет в кэше,
+    дальше его поддерживает followers_changed() по сигналам Follow.
+    '''
+    key = celebrities_key()
+    authors = cache.get(key)
+    if authors is None:
+        authors = frozenset(
+            Follow.objects.order_by()
+            .values('author')
+            .annotate(followers=Count('pk'))
+            .filter(followers__gt=fanout_limit())
+            .values_list('author', flat=True)
+        )
+        cache.set(key, authors, follow_graph.graph_timeout())
+    return authors
+
+
+def followers_changed(author_id, followed):
+    '''Подписка на автора добавлена (followed) или удалена.
+
+    Автор, перешедший порог, попадает в множество популярных
+    или покидает его. Пока он был популярен, его новые посты
+    и подписки на него по лентам не раскладывались, поэтому
+    после выхода из множества ленты подписчиков дописываются.
+    '''
+    count = follow_graph.followers_count(author_id)
+    limit = fanout_limit()
+    if count != (limit + 1 if followed else limit):
+        return
+    authors = celebrities()
+    cache.set(
+        celebrities_key(),
+        authors | {author_id} if followed else authors - {author_id},
+        follow_graph.graph_timeout()
+    )
+    if not followed:
+        fill_author(author_id)
+        bump_follower_feeds(author_id)
+
+
+def is_celebrity(author):
+    '''Автор слишком популярен, чтобы раскладывать его посты по лентам'''
+    return getattr(author, 'pk', author) in celebrities()
+
+
+def celebrity_followees(user):
+    '''id популярных авторов из подписок пользователя'''
+    authors = celebrities()
+    if not authors:
+        return []
+    return [
+        author for author in follow_graph.followees(user)
+        if author in authors
+    ]
+
+
+def _bulk_insert(items):
+    FeedItem.objects.bulk_create(items, ignore_conflicts=True)
+
+
+def _insert_and_bump(items):
+    _bulk_insert(items)
+    page_cache.bump_many(
+        page_cache.feed_scope(item.user_id) for item in items
+    )
+
+
+def fan_out_post(post):
+    '''Раскладывает новый пост по лентам подписчиков автора
+       и сбрасывает их закэшированные страницы'''
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author=post.author_id
+    ).values_list('user', flat=True)
+    batch = []
+    for user_id in followers.iterator(chunk_size=FEED_BATCH_SIZE):
+        batch.append(FeedItem(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        ))
+        if len(batch) >= FEED_BATCH_SIZE:
+            _insert_and_bump(batch)
+            batch = []
+    _insert_and_bump(batch)
+
+
+def bump_follower_feeds(author_id):
+    '''Сбрасывает закэшированные ленты подписчиков автора.
+
+    Ленты подписчиков популярного автора не сбрасываются по одной:
+    они сами следят за поколением его страниц (см. page_version).
+    '''
+    if is_celebrity(author_id):
+        return
+    followers = Follow.objects.filter(
+        author=author_id
+    ).values_list('user', flat=True)
+    batch = []
+    for user_id in followers.iterator(chunk_size=FEED_BATCH_SIZE):
+        batch.append(page_cache.feed_scope(user_id))
+        if len(batch) >= FEED_BATCH_SIZE:
+            page_cache.bump_many(batch)
+            batch = []
+    page_cache.bump_many(batch)
+
+
+def add_author(user, author):
+    '''Добавляет в ленту пользователя посты автора после подписки'''
+    if is_celebrity(author):
+        return
+    posts = Post.objects.filter(author=author).values_list('pk', 'pub_date')
+    batch = []
+    for post_id, pub_date in posts.iterator(chunk_size=FEED_BATCH_SIZE):
+        batch.append(FeedItem(
+            user_id=getattr(user, 'pk', user),
+            post_id=post_id,
+            author_id=getattr(author, 'pk', author),
+            pub_date=pub_date,
+        ))
+        if len(batch) >= FEED_BATCH_SIZE:
+            _bulk_insert(batch)
+            batch = []
+    _bulk_insert(batch)
+
+
+def remove_author(user, author):
+    '''Убирает посты автора из ленты пользователя после отписки'''
+    FeedItem.objects.filter(user=user, author=author).delete()
+
+
+def _fill(rows):
+    '''Записывает строки ленты (user, author, post, pub_date)
+       пачками; возвращает их количество'''
+    total = 0
+    batch = []
+    for user_id, author_id, post_id, pub_date in rows.iterator(
+        chunk_size=FEED_BATCH_SIZE
+    ):
+        batch.append(FeedItem(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        ))
+        if len(batch) >= FEED_BATCH_SIZE:
+            _bulk_insert(batch)
+            total += len(batch)
+            batch = []
+    _bulk_insert(batch)
+    return total + len(batch)
+
+
+def _follow_rows(follows):
+    return (
+        follows.filter(author__posts__isnull=False)
+        .order_by()
+        .values_list(
+            'user', 'author', 'author__posts', 'author__posts__pub_date'
+        )
+    )
+
+
+def fill_author(author_id):
+    '''Дописывает посты автора в ленты всех его подписчиков'''
+    return _fill(_follow_rows(Follow.objects.filter(author=author_id)))
+
+
+def rebuild(users=None):
+    '''Пересобирает материализованные ленты целиком или для users.
+
+    Возвращает количество записанных строк ленты.
+    '''
+    items = FeedItem.objects.all()
+    follows = Follow.objects.all()
+    if users is not None:
+        items = items.filter(user__in=users)
+        follows = follows.filter(user__in=users)
+    items.delete()
+    cache.delete(celebrities_key())
+    page_cache.bump(FEEDS_SCOPE)
+    return _fill(_follow_rows(follows.exclude(author__in=celebrities())))
+
+
+def follow_feed(user):
+    '''Посты ленты подписок пользователя, от новых к старым.
+
+    Без популярных авторов лента читается одним диапазоном индекса
+    feed_user_pub_date_idx, иначе их посты подмешиваются при чтении.
+    '''
+    posts = Post.objects.select_related('author', 'group')
+    celebrities = celebrity_followees(user)
+    if not celebrities:
+        return posts.filter(feed_items__user=user).annotate(
+            feed_date=F('feed_items__pub_date'),
+            feed_post=F('feed_items__post'),
+        ).order_by('-feed_date', '-feed_post')
+    return posts.filter(
+        Q(pk__in=FeedItem.objects.filter(user=user).values('post'))
+        | Q(author__in=celebrities)
+    ).order_by('-pub_date', '-pk')
+
+
+def page_scope(request, **kwargs):
+    '''Кэш страниц ленты подписок у каждого пользователя свой'''
+    return page_cache.feed_scope(request.user.pk)
+
+
+def page_version(request, scope):
+    '''Версия страницы ленты подписок без SQL.
+
+    Складывается из поколения ленты пользователя, общего поколения
+    лент и поколений страниц его популярных авторов: их посты
+    подмешиваются при чтении, а подписчиков по одному не сбрасывают.
+    '''
+    scopes = [FEEDS_SCOPE, scope] + [
+        page_cache.author_scope(author)
+        for author in celebrity_followees(request.user)
+    ]
+    return '|'.join(page_cache.generations(scopes))
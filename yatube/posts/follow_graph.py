@@ -0,0 +1,97 @@
+"""Граф подписок в кэше.
+
+Подписки пользователя хранятся одной записью кэша — отсортированным
+массивом id авторов (array('I'), 4 байта на подписку), так что
+is_following() — это бинарный поиск без SQL. Число подписчиков автора
+хранится отдельным счетчиком. Сигналы Follow сбрасывают записи
+читателя и автора, следующее чтение собирает их заново одним запросом.
+После массовой загрузки подписок в обход сигналов весь граф
+сбрасывается через reset().
+"""
+import uuid
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from posts.models import Follow
+
+
+GENERATION_KEY = 'follows:gen'
+
+
+def graph_timeout():
+    return getattr(settings, 'FOLLOW_GRAPH_TIMEOUT', 24 * 60 * 60)
+
+
+def _generation():
+    value = cache.get(GENERATION_KEY)
+    if value is None:
+        cache.add(GENERATION_KEY, uuid.uuid4().hex[:8], None)
+        value = cache.get(GENERATION_KEY)
+    return value
+
+
+def _followees_key(user_id):
+    return f'follows:out:{_generation()}:{user_id}'
+
+
+def _followers_key(author_id):
+    return f'follows:in:{_generation()}:{author_id}'
+
+
+def _id(user):
+    return getattr(user, 'pk', user)
+
+
+def followees(user):
+    '''Отсортированный массив id авторов, на которых подписан user'''
+    key = _followees_key(_id(user))
+    data = cache.get(key)
+    ids = array('I')
+    if data is None:
+        ids.extend(Follow.objects.filter(user=_id(user)).order_by(
+            'author'
+        ).values_list('author', flat=True))
+        cache.set(key, ids.tobytes(), graph_timeout())
+    else:
+        ids.frombytes(data)
+    return ids
+
+
+def is_following(user, author):
+    '''Подписан ли user на author; аноним ни на кого не подписан'''
+    if user is None or not getattr(user, 'is_authenticated', True):
+        return False
+    ids = followees(user)
+    author_id = _id(author)
+    position = bisect_left(ids, author_id)
+    return position < len(ids) and ids[position] == author_id
+
+
+def followees_count(user):
+    return len(followees(user))
+
+
+def followers_count(author):
+    key = _followers_key(_id(author))
+    count = cache.get(key)
+    if count is None:
+        count = Follow.objects.filter(author=_id(author)).count()
+        cache.set(key, count, graph_timeout())
+    return count
+
+
+def changed(user_id, author_id):
+    '''Подписка user_id на author_id добавлена или удалена'''
+    keys = [_followees_key(user_id), _followers_key(author_id)]
+    cache.delete_many(keys)
+    # до коммита другой запрос мог успеть закэшировать старый граф
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def reset():
+    '''Сбрасывает весь граф, например после массовой загрузки подписок'''
+    cache.set(GENERATION_KEY, uuid.uuid4().hex[:8], None)
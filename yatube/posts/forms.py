@@ -1,12 +1,22 @@
 
 from django import forms
+from .images import check_limits
 from .models import Post, Comment
 
 
+class LimitedImageField(forms.ImageField):
+    '''Проверяет размер файла и число пикселей до декодирования'''
+    def to_python(self, data):
+        if data not in self.empty_values:
+            check_limits(data)
+        return super().to_python(data)
+
+
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ['text', 'group', 'image']
+        field_classes = {'image': LimitedImageField}
         labels = {
             'text': 'Текст поста',
             'group': 'Группа',
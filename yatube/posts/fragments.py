@@ -0,0 +1,103 @@
+"""Личные фрагменты страниц, закэшированных для всех (hole punching).
+
+posts.page_cache хранит одну оболочку страницы на всех посетителей.
+Все, что зависит от посетителя (шапка с именем, вкладки подписок,
+кнопка подписки, рекомендации), выводится тегом {% personal 'имя' %}.
+Внутри view с декоратором personal_page вместо фрагмента остается
+метка, а перед ответом метки заменяются фрагментами текущего
+посетителя — и для свежей, и для закэшированной оболочки.
+На остальных страницах тег просто рисует фрагмент на месте.
+
+Текст постов экранируется шаблонами, поэтому метку нельзя подделать
+содержимым страницы; имена фрагментов берутся только из реестра.
+"""
+import re
+from functools import wraps
+
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts import follow_graph, suggestions
+from posts.conditional import author_id
+
+
+FRAGMENTS = {}
+PLACEHOLDER = re.compile(r'<!--personal:([a-z_]+)-->')
+
+
+def fragment(name):
+    '''Регистрирует функцию (request, **kwargs view) -> HTML'''
+    def decorator(func):
+        FRAGMENTS[name] = func
+        return func
+    return decorator
+
+
+def is_shell(request):
+    '''Собирается общая оболочка страницы'''
+    return getattr(request, 'page_shell', False)
+
+
+def placeholder(name):
+    if name not in FRAGMENTS:
+        raise KeyError(f'Нет личного фрагмента {name}')
+    return mark_safe(f'<!--personal:{name}-->')
+
+
+def render(name, request):
+    kwargs = request.resolver_match.kwargs if request.resolver_match else {}
+    return mark_safe(FRAGMENTS[name](request, **kwargs))
+
+
+def fill(content, request, charset='utf-8'):
+    '''Подставляет в оболочку фрагменты текущего посетителя'''
+    text = content.decode(charset)
+    if '<!--personal:' not in text:
+        return content
+    return PLACEHOLDER.sub(
+        lambda match: render(match.group(1), request), text
+    ).encode(charset)
+
+
+def personal_page(view):
+    '''View отдает общую оболочку, личное подставляется в ответ'''
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.page_shell = True
+        response = view(request, *args, **kwargs)
+        request.page_shell = False
+        if response.status_code == 200 and not response.streaming:
+            response.content = fill(
+                response.content, request, response.charset
+            )
+        return response
+    return wrapper
+
+
+@fragment('header')
+def header(request, **kwargs):
+    return render_to_string('posts/includes/header.html', request=request)
+
+
+@fragment('switcher')
+def switcher(request, **kwargs):
+    return render_to_string('posts/includes/switcher.html', request=request)
+
+
+@fragment('follow_button')
+def follow_button(request, username, **kwargs):
+    # id автора уже найден для ETag профиля и запомнен в request
+    author = author_id(request, username)
+    return render_to_string('posts/includes/follow_button.html', {
+        'username': username,
+        'following': author is not None and follow_graph.is_following(
+            request.user, author
+        ),
+    }, request=request)
+
+
+@fragment('suggestions')
+def follow_suggestions(request, **kwargs):
+    return render_to_string('posts/includes/suggestions.html', {
+        'suggestions': suggestions.for_user(request.user),
+    }, request=request)
@@ -0,0 +1,139 @@
+"""Проверка и перекодирование загруженных картинок постов.
+
+До декодирования проверяются размер файла и число пикселей
+(по заголовку), поэтому «бомбы» вида 50000x50000 в маленьком PNG
+отклоняются сразу. Принятая картинка затем перекодируется в пуле
+процессов: EXIF удаляется, длинная сторона ограничивается
+POST_IMAGE_MAX_SIDE, формат — POST_IMAGE_FORMAT.
+
+Одинаковые файлы хранятся один раз (core.storage), поэтому файл
+удаляется только когда на него не ссылается ни один пост.
+"""
+import io
+import warnings
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db.models import Count, Q
+from PIL import Image, ImageOps
+from sorl.thumbnail import delete
+from sorl.thumbnail.images import ImageFile
+
+from core.uploads import max_upload_size
+from posts.models import Post
+
+
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp', 'PNG': 'png'}
+
+
+def max_pixels():
+    return getattr(settings, 'POST_IMAGE_MAX_PIXELS', 40 * 1000 * 1000)
+
+
+def max_side():
+    return getattr(settings, 'POST_IMAGE_MAX_SIDE', 1920)
+
+
+def image_format():
+    return getattr(settings, 'POST_IMAGE_FORMAT', 'JPEG')
+
+
+def keep_originals():
+    return getattr(settings, 'POST_IMAGE_KEEP_ORIGINALS', False)
+
+
+def image_storage():
+    return Post._meta.get_field('image').storage
+
+
+def check_limits(upload):
+    '''Отклоняет файл, не декодируя его, если он слишком большой'''
+    if getattr(upload, 'truncated', False) or upload.size > max_upload_size():
+        raise ValidationError(
+            'Файл больше %(limit)d МБ',
+            code='file_too_large',
+            params={'limit': max_upload_size() // (1024 * 1024)},
+        )
+    position = upload.tell()
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            # open читает только заголовок
+            width, height = Image.open(upload).size
+            pixels = width * height
+    except Image.DecompressionBombError:
+        pixels = float('inf')
+    except Exception:
+        # не картинка: это сообщит ImageField
+        return
+    finally:
+        upload.seek(position)
+    if pixels > max_pixels():
+        raise ValidationError(
+            'Картинка больше %(limit)d мегапикселей',
+            code='too_many_pixels',
+            params={'limit': max_pixels() // (1000 * 1000)},
+        )
+
+
+def reencode(name):
+    '''Перекодирует картинку из хранилища и возвращает имя нового файла.
+
+    Выполняется в пуле процессов. Оригинал остается на месте.
+    '''
+    Image.MAX_IMAGE_PIXELS = max_pixels()
+    with image_storage().open(name) as source:
+        image = Image.open(source)
+        # поворот из EXIF применяется до того, как EXIF будет удален
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side(), max_side()), Image.LANCZOS)
+        if image.mode not in ('RGB', 'L'):
+            background = Image.new('RGB', image.size, 'white')
+            image = image.convert('RGBA')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        content = io.BytesIO()
+        image.save(
+            content, image_format(),
+            quality=getattr(settings, 'POST_IMAGE_QUALITY', 85),
+            optimize=True,
+        )
+    return image_storage().save(
+        f'posts/image.{EXTENSIONS[image_format()]}',
+        ContentFile(content.getvalue())
+    )
+
+
+def stored_files(directory='posts'):
+    '''Имена всех файлов картинок, включая шардированные каталоги'''
+    storage = image_storage()
+    if not storage.exists(directory):
+        return
+    directories, files = storage.listdir(directory)
+    for file in files:
+        yield f'{directory}/{file}'
+    for child in directories:
+        yield from stored_files(f'{directory}/{child}')
+
+
+def references():
+    '''Сколько постов ссылается на каждый файл картинки'''
+    counts = Counter()
+    for field in ('image', 'original'):
+        counts.update(dict(
+            Post.objects.exclude(**{field: ''})
+            .values_list(field)
+            .annotate(count=Count('pk'))
+            .order_by()
+        ))
+    return counts
+
+
+def release(name):
+    '''Удаляет файл и его миниатюры, если на него никто не ссылается'''
+    if Post.objects.filter(Q(image=name) | Q(original=name)).exists():
+        return False
+    delete(ImageFile(name, image_storage()))
+    return True
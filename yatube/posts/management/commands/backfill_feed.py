@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import feed
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Пользователи, чьи ленты нужно пересобрать (по умолчанию все)'
+        )
+
+    def handle(self, *args, **options):
+        users = None
+        if options['usernames']:
+            users = list(User.objects.filter(
+                username__in=options['usernames']
+            ).values_list('pk', flat=True))
+        with transaction.atomic():
+            total = feed.rebuild(users)
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано строк ленты: {total}'
+        ))
@@ -0,0 +1,71 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import CommandError
+from django.urls import resolve, reverse
+
+from posts.management.commands import bench_views
+
+
+# HTML-страница -> запросы API, которые нужны клиенту вместо нее
+API_VIEWS = {
+    'posts:index': ['posts:api_index'],
+    'posts:group_list': ['posts:api_group_posts'],
+    'posts:profile': ['posts:api_profile_posts'],
+    'posts:post_detail': ['posts:api_post', 'posts:api_comments'],
+    'posts:follow_index': ['posts:api_follow'],
+}
+
+
+class Command(bench_views.Command):
+    help = (
+        'Сравнивает пропускную способность (запросов в секунду) HTML-'
+        'страниц и JSON API на тех же данных (см. generate_data)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом'
+        )
+        bench_views.add_clear_cache_argument(parser)
+
+    def handle(self, *args, **options):
+        if options['cold']:
+            bench_views.check_clear_cache(options)
+        self.stdout.write(
+            f'{"view":<14} {"HTML, rps":>10} {"API, rps":>10} '
+            f'{"ускорение":>10} {"HTML, КБ":>9} {"API, КБ":>8}'
+        )
+        for name, client, url in self.targets():
+            match = resolve(url)
+            api_urls = [
+                reverse(api_name, kwargs=match.kwargs)
+                for api_name in API_VIEWS[match.view_name]
+            ]
+            html_rps, html_size = self.throughput(client, [url], options)
+            api_rps, api_size = self.throughput(client, api_urls, options)
+            self.stdout.write(
+                f'{name:<14} {html_rps:>10.0f} {api_rps:>10.0f} '
+                f'{api_rps / html_rps:>9.1f}x '
+                f'{html_size / 1024:>9.1f} {api_size / 1024:>8.1f}'
+            )
+
+    def throughput(self, client, urls, options):
+        '''Страниц в секунду; страница — это все запросы из urls'''
+        size = 0
+        elapsed = 0
+        for _ in range(options['repeat']):
+            if options['cold']:
+                cache.clear()
+            started = time.perf_counter()
+            responses = [client.get(url) for url in urls]
+            elapsed += time.perf_counter() - started
+            for url, response in zip(urls, responses):
+                if response.status_code != 200:
+                    raise CommandError(
+                        f'{url}: ответ {response.status_code}'
+                    )
+            size = sum(len(response.content) for response in responses)
+        return options['repeat'] / elapsed, size
@@ -0,0 +1,90 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from posts import feed
+from posts.models import Follow, Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает материализованную ленту подписок с JOIN через Follow. '
+        'Данные создаются в транзакции и откатываются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--followers', type=int, default=10000)
+        parser.add_argument('--authors', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        # Сначала чистый fan-out on write, затем гибридный режим,
+        # в котором автор с followers подписчиками читается при запросе
+        for limit in (options['followers'], options['followers'] - 1):
+            with override_settings(FEED_FANOUT_LIMIT=limit):
+                with transaction.atomic():
+                    self.run(**options)
+                    transaction.set_rollback(True)
+                cache.delete(feed.celebrities_key())
+
+    def timed(self, label, func, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        elapsed = (time.perf_counter() - start) / repeat
+        self.stdout.write(f'{label:<40} {elapsed * 1000:9.3f} ms')
+
+    def run(self, followers, authors, posts, repeat, **options):
+        User.objects.bulk_create(
+            User(username=f'bench_reader_{i}') for i in range(followers)
+        )
+        User.objects.bulk_create(
+            User(username=f'bench_author_{i}') for i in range(authors)
+        )
+        readers = list(User.objects.filter(
+            username__startswith='bench_reader_'
+        ).values_list('pk', flat=True))
+        writers = list(User.objects.filter(
+            username__startswith='bench_author_'
+        ).values_list('pk', flat=True))
+        now = timezone.now()
+        Post.objects.bulk_create(
+            Post(text='bench', author_id=author, pub_date=now)
+            for author in writers for _ in range(posts)
+        )
+        Follow.objects.bulk_create(
+            Follow(user_id=reader, author_id=writers[0]) for reader in readers
+        )
+        Follow.objects.bulk_create(
+            Follow(user_id=readers[0], author_id=author)
+            for author in writers[1:]
+        )
+        feed.rebuild()
+        reader = User.objects.get(pk=readers[0])
+        self.stdout.write(
+            f'Подписчиков у автора: {followers}, '
+            f'подписок у читателя: {authors}, постов у автора: {posts}, '
+            f'FEED_FANOUT_LIMIT: {feed.fanout_limit()}'
+        )
+
+        def join_page():
+            queryset = Post.objects.filter(
+                author__folowwing__user=reader
+            ).select_related('author', 'group')
+            list(queryset[:10])
+
+        def feed_page():
+            list(feed.follow_feed(reader)[:10])
+
+        self.timed('Страница ленты, JOIN через Follow', join_page, repeat)
+        self.timed('Страница ленты, материализованная', feed_page, repeat)
+        self.timed(
+            f'Публикация поста на {followers} подписчиков',
+            lambda: Post.objects.create(text='bench', author_id=writers[0]),
+            max(1, repeat // 10)
+        )
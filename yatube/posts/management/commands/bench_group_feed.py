@@ -0,0 +1,80 @@
+import random
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+
+from posts.management.commands.bench_views import (
+    add_clear_cache_argument, check_clear_cache, percentile
+)
+from posts.models import Group, Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет страницу группы при росте общего числа постов: '
+        'посты раскладываются по --groups группам, задержка страницы '
+        'не должна расти вместе с таблицей. Данные откатываются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--groups', type=int, default=1000)
+        parser.add_argument(
+            '--posts', default='10000,100000,500000',
+            help='Общее число постов на каждом шаге, через запятую'
+        )
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=None)
+        add_clear_cache_argument(parser)
+
+    def handle(self, *args, **options):
+        check_clear_cache(options)
+        with transaction.atomic():
+            self.run(**options)
+            transaction.set_rollback(True)
+
+    def run(self, groups, posts, repeat, seed, **options):
+        rng = random.Random(seed)
+        author = User.objects.create(username='bench_group_feed')
+        Group.objects.bulk_create(
+            Group(title=f'Группа {i}', slug=f'bench-group-{i}')
+            for i in range(groups)
+        )
+        group_ids = list(Group.objects.filter(
+            slug__startswith='bench-group-'
+        ).values_list('pk', flat=True))
+        client = Client()
+        self.stdout.write(
+            f'{"постов":>9} {"в группе":>9} {"p50, ms":>9} {"p95, ms":>9}'
+        )
+        total = 0
+        for target in sorted(int(size) for size in posts.split(',')):
+            batch = 50000
+            while total < target:
+                size = min(batch, target - total)
+                Post.objects.bulk_create(
+                    Post(
+                        text=f'Пост {total + i}',
+                        author=author,
+                        group_id=rng.choice(group_ids),
+                    )
+                    for i in range(size)
+                )
+                total += size
+            group = Group.objects.get(pk=rng.choice(group_ids))
+            url = reverse('posts:group_list', args=[group.slug])
+            timings = []
+            for _ in range(repeat):
+                # без кэша страниц и карточек: замеряем саму выборку
+                cache.clear()
+                started = time.perf_counter()
+                client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f'{total:>9} {group.group.count():>9} '
+                f'{percentile(timings, 50):>9.2f} '
+                f'{percentile(timings, 95):>9.2f}'
+            )
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import transaction
+
+from core.paginator import NEXT, CursorPaginator, encode_cursor
+from posts.models import Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает Paginator (COUNT + OFFSET) и CursorPaginator '
+        'на глубоких страницах. Данные откатываются после замера'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=200000)
+        parser.add_argument('--per-page', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(**options)
+            transaction.set_rollback(True)
+
+    def timed(self, func, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - start) / repeat * 1000
+
+    def run(self, posts, per_page, repeat, **options):
+        author = User.objects.create(username='bench_pagination')
+        Post.objects.bulk_create(
+            Post(text='bench', author=author) for _ in range(posts)
+        )
+        queryset = Post.objects.select_related('author', 'group')
+        last_page = posts // per_page
+        numbers = sorted({1, 10, 100, 1000, last_page // 2, last_page})
+        self.stdout.write(
+            f'{"Страница":>10} {"OFFSET, ms":>12} {"курсор, ms":>12}'
+        )
+        for number in numbers:
+            if number > last_page:
+                continue
+            anchor = queryset.order_by('-pub_date', '-pk')[
+                (number - 1) * per_page - 1 if number > 1 else 0
+            ]
+            cursor = encode_cursor(NEXT, [anchor.pub_date, anchor.pk])
+            offset = self.timed(
+                lambda: list(Paginator(queryset, per_page).page(number)),
+                repeat
+            )
+            keyset = self.timed(
+                lambda: list(
+                    CursorPaginator(queryset, per_page).get_page(
+                        cursor=cursor if number > 1 else None
+                    )
+                ),
+                repeat
+            )
+            self.stdout.write(f'{number:>10} {offset:>12.3f} {keyset:>12.3f}')
@@ -0,0 +1,83 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template import engines
+from django.test import RequestFactory
+
+from core.paginator import CursorPaginator
+from posts.management.commands.bench_views import (
+    add_clear_cache_argument, check_clear_cache
+)
+from posts.models import Group, Post, User
+
+
+PAGE = (
+    "{% extends 'base.html' %}{% load post_cards %}{% block content %}"
+    "{% for post in page_obj %}CARD{% endfor %}{% endblock %}"
+)
+UNCACHED = PAGE.replace(
+    'CARD', "{% include 'posts/includes/post_card.html' %}"
+)
+CACHED = PAGE.replace('CARD', '{% post_card post %}')
+
+
+class Command(BaseCommand):
+    help = (
+        'Время отрисовки страницы из 10 постов с кэшем карточек '
+        'и без него. Данные откатываются после замера'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200)
+        add_clear_cache_argument(parser)
+
+    def handle(self, *args, **options):
+        check_clear_cache(options)
+        with transaction.atomic():
+            self.run(options['repeat'])
+            transaction.set_rollback(True)
+
+    def timed(self, func, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - start) / repeat * 1000
+
+    def run(self, repeat):
+        author = User.objects.create(
+            username='bench_cards', first_name='Лев', last_name='Толстой'
+        )
+        group = Group.objects.create(
+            title='Бенчмарк', slug='bench-cards', description='-'
+        )
+        Post.objects.bulk_create(
+            Post(text='Текст поста ' * 50, author=author, group=group)
+            for _ in range(10)
+        )
+        posts = Post.objects.select_related('author', 'group')
+        page_obj = CursorPaginator(posts, 10).get_page()
+        request = RequestFactory().get('/')
+        request.user = author
+        engine = engines['django']
+        uncached_page = engine.from_string(UNCACHED)
+        cached_page = engine.from_string(CACHED)
+
+        def uncached():
+            uncached_page.render({'page_obj': page_obj}, request)
+
+        def cached():
+            cached_page.render({'page_obj': page_obj}, request)
+
+        def cold():
+            cache.clear()
+            cached()
+
+        results = [
+            ('Без кэша карточек', self.timed(uncached, repeat)),
+            ('Холодный кэш', self.timed(cold, repeat)),
+            ('Теплый кэш', self.timed(cached, repeat)),
+        ]
+        for label, elapsed in results:
+            self.stdout.write(f'{label:<20} {elapsed:8.3f} ms')
@@ -0,0 +1,77 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from faker import Faker
+
+from posts.models import Post, User
+from posts.search import search
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск через LIKE и через индекс FTS5 '
+        'на большом числе постов. Данные откатываются после замера'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(**options)
+            transaction.set_rollback(True)
+
+    def timed(self, func, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = func()
+        return (time.perf_counter() - start) / repeat * 1000, result
+
+    def run(self, posts, repeat, seed, **options):
+        fake = Faker('ru_RU')
+        fake.seed_instance(seed)
+        rng = random.Random(seed)
+        # словарь заранее: Faker на миллион текстов слишком медленный
+        words = list({
+            word for _ in range(2000)
+            for word in fake.sentence(nb_words=10).rstrip('.').split()
+        })
+        author = User.objects.create(username='bench_search')
+        started = time.perf_counter()
+        batch = 50000
+        for start in range(0, posts, batch):
+            Post.objects.bulk_create(
+                Post(
+                    text=' '.join(rng.choices(words, k=rng.randint(5, 40))),
+                    author=author,
+                )
+                for _ in range(min(batch, posts - start))
+            )
+        self.stdout.write(
+            f'Постов: {posts}, вставка с индексом: '
+            f'{time.perf_counter() - started:.1f} с'
+        )
+        queryset = Post.objects.filter(author=author)
+        queries = [rng.choice(words) for _ in range(3)]
+        queries.append(f'{queries[0]} {queries[1]}')
+        self.stdout.write(
+            f'{"запрос":<30} {"LIKE, ms":>10} {"FTS5, ms":>10} {"найдено":>9}'
+        )
+        for query in queries:
+            like, _ = self.timed(
+                lambda: list(queryset.filter(
+                    text__icontains=query
+                ).order_by('-pub_date')[:10]),
+                repeat
+            )
+            fts, _ = self.timed(
+                lambda: list(search(queryset, query)[:10]), repeat
+            )
+            found = search(queryset, query).count()
+            self.stdout.write(
+                f'{query[:30]:<30} {like:>10.1f} {fts:>10.1f} {found:>9}'
+            )
@@ -0,0 +1,168 @@
+import json
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from core.paginator import LAST, encode_cursor
+from core.queries import QueryRecorder
+from posts.models import Follow, Group, Post, User
+
+
+def percentile(values, share):
+    '''Перцентиль по ближайшему рангу'''
+    values = sorted(values)
+    rank = max(math.ceil(share / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def add_clear_cache_argument(parser):
+    parser.add_argument(
+        '--yes-clear-cache', action='store_true',
+        help='Разрешить очистку кэша при выключенном DEBUG'
+    )
+
+
+def check_clear_cache(options):
+    '''Без DEBUG кэш по умолчанию — общий SQLiteCache сайта: очищать его
+       можно только с явного согласия'''
+    if not (settings.DEBUG or options['yes_clear_cache']):
+        raise CommandError(
+            'Замер очищает общий кэш сайта: включите DEBUG '
+            'или передайте --yes-clear-cache'
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет p50/p95/p99 задержки и число SQL-запросов для лент '
+        'и страницы поста на текущих данных (см. generate_data)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом'
+        )
+        add_clear_cache_argument(parser)
+        parser.add_argument('--save', help='Записать результат в JSON')
+        parser.add_argument(
+            '--compare', help='Сравнить с ранее сохраненным JSON'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=20,
+            help='Допустимый рост p95, в процентах'
+        )
+
+    def handle(self, *args, **options):
+        if options['cold']:
+            check_clear_cache(options)
+        results = {
+            name: self.measure(client, url, options)
+            for name, client, url in self.targets()
+        }
+        self.report(results)
+        if options['save']:
+            with open(options['save'], 'w') as file:
+                json.dump(results, file, indent=2, ensure_ascii=False)
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)
+            regressions = self.compare(
+                results, baseline, options['tolerance']
+            )
+            if regressions:
+                raise CommandError(
+                    f'Регрессии относительно {options["compare"]}: '
+                    + ', '.join(regressions)
+                )
+
+    def targets(self):
+        '''Самые тяжелые объекты каждого вида: так видна верхняя граница'''
+        anonymous = Client()
+        post = Post.objects.order_by('-comments_count').first()
+        group = Group.objects.order_by('-posts_count').first()
+        author = User.objects.filter(
+            post_counter__isnull=False
+        ).order_by('-post_counter__posts_count').first()
+        follower = User.objects.annotate(
+            followees=Count('folowwer')
+        ).order_by('-followees').first()
+        if not (post and group and author and follower):
+            raise CommandError(
+                'Нет данных: сначала выполните generate_data'
+            )
+        reader = Client()
+        reader.force_login(follower)
+        self.stdout.write(
+            f'Подписок у читателя ленты: '
+            f'{Follow.objects.filter(user=follower).count()}'
+        )
+        return [
+            ('index', anonymous, reverse('posts:index')),
+            ('group_list', anonymous,
+             reverse('posts:group_list', args=[group.slug])),
+            ('profile', anonymous,
+             reverse('posts:profile', args=[author.username])),
+            ('post_detail', anonymous,
+             reverse('posts:post_detail', args=[post.pk])),
+            # самые старые комментарии того же поста
+            ('post_comments', anonymous,
+             reverse('posts:post_comments', args=[post.pk])
+             + '?cursor=' + encode_cursor(LAST)),
+            ('follow_index', reader, reverse('posts:follow_index')),
+        ]
+
+    def measure(self, client, url, options):
+        timings = []
+        queries = []
+        for _ in range(options['repeat']):
+            if options['cold']:
+                cache.clear()
+            with QueryRecorder() as recorder:
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'{url}: ответ {response.status_code}')
+            queries.append(len(recorder))
+        return {
+            'url': url,
+            'p50': round(percentile(timings, 50), 2),
+            'p95': round(percentile(timings, 95), 2),
+            'p99': round(percentile(timings, 99), 2),
+            'queries': max(queries),
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"view":<14} {"p50, ms":>9} {"p95, ms":>9} {"p99, ms":>9} '
+            f'{"SQL":>5}'
+        )
+        for name, row in results.items():
+            self.stdout.write(
+                f'{name:<14} {row["p50"]:>9.2f} {row["p95"]:>9.2f} '
+                f'{row["p99"]:>9.2f} {row["queries"]:>5}'
+            )
+
+    def compare(self, results, baseline, tolerance):
+        regressions = []
+        for name, row in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            change = (row['p95'] - before['p95']) / before['p95'] * 100
+            self.stdout.write(
+                f'{name:<14} p95 {before["p95"]:.2f} -> {row["p95"]:.2f} '
+                f'({change:+.0f}%), SQL {before["queries"]} -> '
+                f'{row["queries"]}'
+            )
+            if change > tolerance or row['queries'] > before['queries']:
+                regressions.append(name)
+        return regressions
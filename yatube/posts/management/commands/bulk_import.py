@@ -0,0 +1,325 @@
+import csv
+import gzip
+import io
+import json
+import re
+import time
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, reset_queries, transaction
+from django.utils import timezone
+
+from posts import bulk, search
+
+
+# порядок важен: при сбросе буферов строки, на которые ссылаются
+# внешние ключи, вставляются раньше ссылающихся
+MODELS = (
+    'auth.user', 'posts.group', 'posts.post', 'posts.comment', 'posts.follow'
+)
+READ_SIZE = 64 * 1024
+SEPARATORS = re.compile(r'[\s,]*')
+
+
+def read_json(file):
+    '''Объекты массива JSON по одному, без чтения файла целиком'''
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидался массив JSON')
+    position = 1
+    while True:
+        position = SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except ValueError:
+            # объект не поместился в буфер: дочитываем файл
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise CommandError('Файл JSON оборван или испорчен')
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item
+
+
+def read_jsonl(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(file):
+    yield from csv.DictReader(file)
+
+
+READERS = {
+    'json': read_json,
+    'jsonl': read_jsonl,
+    'csv': read_csv,
+}
+
+
+class ModelLoader:
+    '''Превращает словарь полей из дампа в объект модели'''
+
+    def __init__(self, model):
+        self.model = model
+        self.fields = {}
+        for field in model._meta.concrete_fields:
+            self.fields[field.name] = field
+            self.fields[field.attname] = field
+        self.auto_now_add = [
+            field for field in model._meta.concrete_fields
+            if getattr(field, 'auto_now_add', False)
+        ]
+
+    def convert(self, field, value):
+        if value in ('', None) and (field.null or field.is_relation):
+            return None
+        if field.is_relation:
+            return field.target_field.to_python(value)
+        return field.to_python(value)
+
+    def build(self, pk, values):
+        kwargs = {}
+        for name, value in values.items():
+            field = self.fields.get(name)
+            # поля many-to-many (группы и права пользователя) пропускаются
+            if field is not None:
+                kwargs[field.attname] = self.convert(field, value)
+        if pk not in ('', None):
+            pk_field = self.model._meta.pk
+            kwargs[pk_field.attname] = self.convert(pk_field, pk)
+        for field in self.auto_now_add:
+            if kwargs.get(field.attname) is None:
+                kwargs[field.attname] = timezone.now()
+        return self.model(**kwargs)
+
+
+class Command(BaseCommand):
+    help = (
+        'Быстро загружает дамп пользователей, групп, постов, комментариев '
+        'и подписок (JSON как у dumpdata, JSON Lines или CSV). Файл '
+        'читается потоком, строки вставляются пачками bulk_create '
+        'в отдельных транзакциях, сигналы не отправляются: счетчики '
+        'и ленты пересчитываются в конце'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл дампа, можно .gz')
+        parser.add_argument(
+            '--format', choices=sorted(READERS),
+            help='По умолчанию определяется по расширению'
+        )
+        parser.add_argument(
+            '--model', choices=MODELS,
+            help='Модель строк без поля "model"'
+        )
+        parser.add_argument(
+            '--batch', type=int, default=2000,
+            help='Строк одной модели в одном bulk_create'
+        )
+        parser.add_argument(
+            '--chunk', type=int, default=50000,
+            help='Строк в одной транзакции'
+        )
+        parser.add_argument(
+            '--defer-indexes', action='store_true',
+            help='Удалить вторичные индексы и триггеры поиска на время '
+                 'загрузки и создать заново в конце'
+        )
+        parser.add_argument(
+            '--ignore-conflicts', action='store_true',
+            help='Пропускать строки с уже занятым первичным ключом'
+        )
+        parser.add_argument(
+            '--skip-feed', action='store_true',
+            help='Не пересобирать ленты подписок (потом: backfill_feed)'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.loaders = {
+            label: ModelLoader(apps.get_model(label)) for label in MODELS
+        }
+        self.loaded = dict.fromkeys(MODELS, 0)
+        self.skipped = 0
+        self.group_ids = set()
+        # профили с новыми постами или подписками
+        self.author_ids = set()
+        # читатели с новыми подписками: их рекомендации устарели
+        self.follower_ids = set()
+        started = time.perf_counter()
+        models = [loader.model for loader in self.loaders.values()]
+        with self.open(options['path']) as file:
+            records = self.records(file, options)
+            with self.deferred_indexes(models, options['defer_indexes']):
+                with bulk.explicit_dates(*(
+                    field for loader in self.loaders.values()
+                    for field in loader.auto_now_add
+                )):
+                    while self.load_chunk(records, started):
+                        pass
+        self.reset_sequences(models)
+        total = sum(self.loaded.values())
+        elapsed = time.perf_counter() - started
+        for label, count in self.loaded.items():
+            if count:
+                self.stdout.write(f'{label}: {count}')
+        if self.skipped:
+            self.stdout.write(f'Пропущено строк других моделей: '
+                              f'{self.skipped}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено {total} строк за {elapsed:.1f} с '
+            f'({total / max(elapsed, 1e-9):.0f} строк/с)'
+        ))
+        self.finish(options)
+
+    @contextmanager
+    def open(self, path):
+        opener = gzip.open if path.endswith('.gz') else io.open
+        try:
+            file = opener(path, 'rt', encoding='utf-8', newline='')
+        except OSError as error:
+            raise CommandError(error)
+        with file:
+            yield file
+
+    def records(self, file, options):
+        '''Пары (модель, pk, поля) из файла'''
+        name = options['path'][:-3] if options['path'].endswith(
+            '.gz') else options['path']
+        extension = name.rsplit('.', 1)[-1]
+        fmt = options['format'] or {'ndjson': 'jsonl'}.get(
+            extension, extension
+        )
+        if fmt not in READERS:
+            raise CommandError(
+                f'Неизвестный формат {fmt!r}, укажите --format'
+            )
+        for record in READERS[fmt](file):
+            if 'model' in record and 'fields' in record:
+                yield record['model'], record.get('pk'), record['fields']
+            elif record.get('model') or options['model']:
+                # плоская строка: CSV из export_posts или --model
+                record = dict(record)
+                model = record.pop('model', None) or options['model']
+                pk = record.pop('pk', None) or record.pop('id', None)
+                yield model, pk, record
+            else:
+                raise CommandError(
+                    'Строка без поля "model": укажите --model'
+                )
+
+    def load_chunk(self, records, started):
+        '''Одна транзакция; False, когда файл закончился'''
+        buffers = {label: [] for label in MODELS}
+        read = 0
+        with transaction.atomic():
+            for label, pk, values in records:
+                loader = self.loaders.get(label)
+                if loader is None:
+                    self.skipped += 1
+                    continue
+                instance = loader.build(pk, values)
+                buffers[label].append(instance)
+                if label == 'posts.post':
+                    self.author_ids.add(instance.author_id)
+                    if instance.group_id:
+                        self.group_ids.add(instance.group_id)
+                elif label == 'posts.follow':
+                    self.author_ids.update(
+                        (instance.user_id, instance.author_id)
+                    )
+                    self.follower_ids.add(instance.user_id)
+                if len(buffers[label]) >= self.options['batch']:
+                    self.flush(label, buffers[label])
+                read += 1
+                if read >= self.options['chunk']:
+                    break
+            # внешние ключи SQLite проверяются при коммите,
+            # к этому моменту все буферы уже сброшены по порядку MODELS
+            for label in MODELS:
+                self.flush(label, buffers[label])
+        if read:
+            total = sum(self.loaded.values())
+            self.stdout.write(
+                f'{total} строк, '
+                f'{total / (time.perf_counter() - started):.0f} строк/с'
+            )
+        return read >= self.options['chunk']
+
+    def flush(self, label, objects):
+        if not objects:
+            return
+        # batch_size подбирает бэкенд: у SQLite свой предел на INSERT
+        self.loaders[label].model.objects.bulk_create(
+            objects, ignore_conflicts=self.options['ignore_conflicts']
+        )
+        self.loaded[label] += len(objects)
+        objects.clear()
+        # при DEBUG = True журнал запросов хранил бы каждый INSERT
+        reset_queries()
+
+    @contextmanager
+    def deferred_indexes(self, models, enabled):
+        '''Снимает вторичные индексы и триггеры, потом создает их заново.
+
+        Уникальные индексы остаются: без них загрузка не заметила бы
+        дубликаты.
+        '''
+        if not enabled:
+            yield
+            return
+        if connection.vendor != 'sqlite':
+            raise CommandError('--defer-indexes поддерживается для SQLite')
+        tables = [model._meta.db_table for model in models]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT type, name, sql FROM sqlite_master "
+                "WHERE type IN ('index', 'trigger') AND sql IS NOT NULL "
+                "AND sql NOT LIKE 'CREATE UNIQUE%%' "
+                f"AND tbl_name IN ({', '.join(['%s'] * len(tables))})",
+                tables
+            )
+            deferred = cursor.fetchall()
+            for kind, name, sql in deferred:
+                cursor.execute(f'DROP {kind.upper()} "{name}"')
+        self.stdout.write(f'Снято индексов и триггеров: {len(deferred)}')
+        try:
+            yield
+        finally:
+            started = time.perf_counter()
+            with connection.cursor() as cursor:
+                for kind, name, sql in deferred:
+                    cursor.execute(sql)
+            if any(kind == 'trigger' for kind, name, sql in deferred):
+                search.rebuild()
+            self.stdout.write(
+                f'Индексы созданы заново за '
+                f'{time.perf_counter() - started:.1f} с'
+            )
+
+    def reset_sequences(self, models):
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def finish(self, options):
+        '''То, что при обычном сохранении сделали бы сигналы'''
+        started = time.perf_counter()
+        bulk.finish(
+            self.group_ids, self.author_ids, self.follower_ids,
+            rebuild_feeds=not options['skip_feed'],
+        )
+        self.stdout.write(
+            f'Счетчики и ленты пересчитаны за '
+            f'{time.perf_counter() - started:.1f} с'
+        )
@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import images
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет из media/posts файлы, на которые не ссылается ни один '
+        'пост, вместе с их миниатюрами'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int,
+            default=getattr(settings, 'MEDIA_ORPHAN_MIN_AGE', 60 * 60),
+            help='Не трогать файлы, сохраненные позже, чем столько секунд'
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, min_age, dry_run, **options):
+        storage = images.image_storage()
+        references = images.references()
+        deadline = time.time() - min_age
+        files = removed = freed = 0
+        for name in images.stored_files():
+            files += 1
+            if name in references:
+                continue
+            # недавно сохраненный файл может ждать коммита ссылки на него
+            if storage.get_modified_time(name).timestamp() > deadline:
+                continue
+            size = storage.size(name)
+            if dry_run or images.release(name):
+                removed += 1
+                freed += size
+        self.stdout.write(
+            f'Файлов: {files}, постов с картинкой: '
+            f'{sum(references.values())}, удалено: {removed} '
+            f'({freed / 1024 / 1024:.1f} МБ)'
+            + (' [dry-run]' if dry_run else '')
+        )
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает популярность постов по событиям последнего окна '
+        'и убирает остывшие посты (запускать периодически, например cron)'
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = trending.compact()
+        self.stdout.write(self.style.SUCCESS(
+            f'Популярных постов: {count} '
+            f'за {time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,136 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core.queries import QueryRecorder, normalize
+from posts.models import Group, Post, User
+
+
+# полный просмотр таблицы: SCAN без индекса (виртуальные таблицы FTS5
+# и подзапросы-константы не в счет) и сортировка во временном B-дереве
+FULL_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)(\w+)(?!.*USING)(?!.*VIRTUAL)')
+TEMP_SORT = re.compile(r'USE TEMP B-TREE')
+CURSOR_LINK = re.compile(r'href="\?cursor=([^"&]+)"')
+
+
+class Command(BaseCommand):
+    help = (
+        'Печатает EXPLAIN QUERY PLAN всех запросов лент, профиля, '
+        'подписок, комментариев и страниц по курсору; падает, если '
+        'какой-то из них читает таблицу целиком или сортирует во '
+        'временном B-дереве'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--quiet', action='store_true',
+            help='Печатать только планы с проблемами'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN есть только в SQLite')
+        problems = []
+        targets = self.targets()
+        # гибридная лента: при FEED_FANOUT_LIMIT = 0 все авторы популярны.
+        # Объединение ленты и постов популярных авторов сортируется
+        # во временном B-дереве намеренно: оно ограничено лентой
+        # пользователя, а обход всего post_pub_date_id_idx — нет
+        for fanout_limit in (None, 0):
+            overrides = {'CACHES': {'default': {
+                # пустой кэш, чтобы все запросы действительно дошли до базы
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': f'explain-feeds-{fanout_limit}',
+            }}}
+            if fanout_limit is not None:
+                overrides['FEED_FANOUT_LIMIT'] = fanout_limit
+                targets = [
+                    (f'{name} (гибрид)', client, url)
+                    for name, client, url in targets
+                    if name.startswith('follow_index')
+                ]
+            with override_settings(**overrides):
+                for name, client, url in targets:
+                    problems.extend(self.explain(
+                        name, client, url, options,
+                        allow_sort=fanout_limit is not None
+                    ))
+        if problems:
+            raise CommandError(
+                'Запросы без подходящего индекса:\n' + '\n'.join(problems)
+            )
+        self.stdout.write(self.style.SUCCESS('Все планы используют индексы'))
+
+    def targets(self):
+        anonymous = Client()
+        post = Post.objects.order_by('-comments_count').first()
+        group = Group.objects.order_by('-posts_count').first()
+        author = User.objects.filter(
+            post_counter__isnull=False
+        ).order_by('-post_counter__posts_count').first()
+        follower = User.objects.annotate(
+            followees=Count('folowwer')
+        ).order_by('-followees').first()
+        if not (post and group and author and follower):
+            raise CommandError(
+                'Нет данных: сначала выполните generate_data'
+            )
+        reader = Client()
+        reader.force_login(follower)
+        targets = [
+            ('index', anonymous, reverse('posts:index')),
+            ('group_list', anonymous,
+             reverse('posts:group_list', args=[group.slug])),
+            ('profile', anonymous,
+             reverse('posts:profile', args=[author.username])),
+            ('post_detail', anonymous,
+             reverse('posts:post_detail', args=[post.pk])),
+            ('follow_index', reader, reverse('posts:follow_index')),
+            ('trending', anonymous, reverse('posts:trending')),
+            # у вошедшего читателя профиль проверяет еще и подписку
+            ('profile_follower', reader,
+             reverse('posts:profile', args=[author.username])),
+        ]
+        # следующая и последняя страницы по курсору из навигации:
+        # там к сортировке добавляется seek, а назад порядок обратный
+        for name, client, url in list(targets):
+            content = client.get(url).content.decode()
+            for cursor in dict.fromkeys(CURSOR_LINK.findall(content)):
+                targets.append(
+                    (f'{name} (курсор)', client, f'{url}?cursor={cursor}')
+                )
+        return targets
+
+    def explain(self, name, client, url, options, allow_sort=False):
+        with QueryRecorder() as recorder:
+            response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f'{url}: ответ {response.status_code}')
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{name}: {url}'))
+        problems = []
+        seen = set()
+        for sql, params in zip(recorder.statements, recorder.params):
+            shape = normalize(sql)
+            if not sql.lstrip().upper().startswith('SELECT') or shape in seen:
+                continue
+            seen.add(shape)
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = [row[-1] for row in cursor.fetchall()]
+            bad = [
+                detail for detail in plan
+                if FULL_SCAN.search(detail)
+                or TEMP_SORT.search(detail) and not allow_sort
+            ]
+            problems.extend(f'{name}: {detail}\n  {sql}' for detail in bad)
+            if bad or not options['quiet']:
+                self.stdout.write(f'  {sql}')
+                for detail in plan:
+                    marker = '!' if detail in bad else ' '
+                    self.stdout.write(f'   {marker} {detail}')
+        return problems
@@ -0,0 +1,58 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+from posts.models import Group, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоком выгружает посты и комментарии автора или группы '
+        'в JSON Lines или CSV (можно со сжатием gzip); '
+        'файл загружается обратно командой bulk_import'
+    )
+
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument('--author', help='Имя пользователя')
+        target.add_argument('--group', help='Слаг группы')
+        parser.add_argument(
+            '--format', choices=sorted(export.FORMATS), default='jsonl'
+        )
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument(
+            '--since',
+            help='Только записи не старше этой даты (ISO), для дозагрузки'
+        )
+        parser.add_argument(
+            '--output', default='-', help='Файл, по умолчанию stdout'
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = export.parse_since(options['since'])
+            except ValueError as error:
+                raise CommandError(error)
+        if options['author']:
+            author = User.objects.filter(username=options['author']).first()
+            if author is None:
+                raise CommandError(f'Нет автора {options["author"]}')
+            rows = export.author_records(author, since)
+        else:
+            group = Group.objects.filter(slug=options['group']).first()
+            if group is None:
+                raise CommandError(f'Нет группы {options["group"]}')
+            rows = export.group_records(group, since)
+        data = export.stream(rows, options['format'], options['gzip'])
+        if options['output'] == '-':
+            self.write(sys.stdout.buffer, data)
+        else:
+            with open(options['output'], 'wb') as file:
+                self.write(file, data)
+
+    def write(self, file, data):
+        for block in data:
+            file.write(block)
@@ -0,0 +1,219 @@
+import io
+import random
+import time
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from posts import bulk, images
+from posts.models import Comment, Follow, Group, Post, User
+
+
+BATCH_SIZE = 5000
+
+
+def power_law_weights(count, alpha):
+    '''Веса Ципфа: i-й по популярности получает 1 / i ** alpha'''
+    return [1 / (rank ** alpha) for rank in range(1, count + 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями и подписками со степенным распределением'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок одного пользователя'
+        )
+        parser.add_argument(
+            '--images', type=float, default=0.2,
+            help='Доля постов с картинкой'
+        )
+        parser.add_argument('--alpha', type=float, default=1.2)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument(
+            '--skip-feed', action='store_true',
+            help='Не собирать ленты подписок (потом: backfill_feed)'
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.now = timezone.now()
+        # метка запуска: повторный запуск не пересекается с прошлыми
+        # по username и slug, даже с тем же --seed
+        self.run_id = uuid.uuid4().hex[:8]
+        self.days = options['days']
+        started = time.perf_counter()
+        with transaction.atomic():
+            users = self.step('Пользователи', self.create_users,
+                              options['users'])
+            groups = self.step('Группы', self.create_groups,
+                               options['groups'])
+            images = self.create_images(options['images'])
+            posts = self.step(
+                'Посты', self.create_posts, options['posts'], users, groups,
+                images, options['images'], options['alpha']
+            )
+            self.step('Комментарии', self.create_comments,
+                      options['comments'], users, posts, options['alpha'])
+            self.step('Подписки', self.create_follows, users,
+                      options['follows'], options['alpha'])
+        # после коммита: страницы пересобираются уже с новыми данными
+        bulk.finish(
+            groups, users, users,
+            rebuild_feeds=not options['skip_feed'],
+            recompute_suggestions=True, step=self.step,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с'
+        ))
+
+    def step(self, label, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        count = result if isinstance(result, int) else len(result)
+        self.stdout.write(
+            f'{label}: {count} за {time.perf_counter() - started:.1f} с'
+        )
+        return result
+
+    def random_date(self):
+        return self.now - timedelta(
+            seconds=self.random.randrange(self.days * 24 * 60 * 60)
+        )
+
+    def bulk(self, model, objects):
+        # batch_size подбирает бэкенд: у SQLite свой предел на INSERT
+        model.objects.bulk_create(objects)
+
+    def create_users(self, count):
+        # один хэш на всех: make_password на каждого занимает минуты
+        password = make_password('password')
+        prefix = f'{self.fake.user_name()}_{self.run_id}'
+        self.bulk(User, [
+            User(
+                username=f'{prefix}_{i}',
+                first_name=self.fake.first_name(),
+                last_name=self.fake.last_name(),
+                email=f'{prefix}_{i}@example.com',
+                password=password,
+            )
+            for i in range(count)
+        ])
+        return list(User.objects.filter(
+            username__startswith=f'{prefix}_'
+        ).values_list('pk', flat=True))
+
+    def create_groups(self, count):
+        # slug() у ru_RU пустой: кириллица не проходит в slug
+        prefix = f'group-{self.run_id}'
+        self.bulk(Group, [
+            Group(
+                title=self.fake.sentence(nb_words=3)[:200],
+                slug=f'{prefix}-{i}',
+                description=self.fake.paragraph(),
+            )
+            for i in range(count)
+        ])
+        return list(Group.objects.filter(
+            slug__startswith=f'{prefix}-'
+        ).values_list('pk', flat=True))
+
+    def create_images(self, share, count=20):
+        if not share:
+            return []
+        names = []
+        for _ in range(count):
+            image = Image.new('RGB', (1200, 800), self.fake.hex_color())
+            content = io.BytesIO()
+            image.save(content, 'JPEG')
+            names.append(images.image_storage().save(
+                'posts/generated.jpg',
+                ContentFile(content.getvalue())
+            ))
+        return names
+
+    def create_posts(self, count, users, groups, images, share, alpha):
+        weights = power_law_weights(len(users), alpha)
+        authors = self.random.choices(users, weights, k=count)
+        field = Post._meta.get_field('pub_date')
+        with bulk.explicit_dates(field):
+            for start in range(0, count, BATCH_SIZE):
+                self.bulk(Post, [
+                    Post(
+                        text=self.fake.text(max_nb_chars=400),
+                        author_id=author,
+                        group_id=(
+                            self.random.choice(groups)
+                            if groups and self.random.random() < 0.7
+                            else None
+                        ),
+                        image=(
+                            self.random.choice(images)
+                            if images and self.random.random() < share
+                            else ''
+                        ),
+                        pub_date=self.random_date(),
+                    )
+                    for author in authors[start:start + BATCH_SIZE]
+                ])
+        return list(Post.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        )[:count])
+
+    def create_comments(self, count, users, posts, alpha):
+        if not posts:
+            return 0
+        # популярные посты собирают большую часть комментариев
+        weights = power_law_weights(len(posts), alpha)
+        targets = self.random.choices(posts, weights, k=count)
+        field = Comment._meta.get_field('created')
+        with bulk.explicit_dates(field):
+            for start in range(0, count, BATCH_SIZE):
+                self.bulk(Comment, [
+                    Comment(
+                        post_id=post,
+                        author_id=self.random.choice(users),
+                        text=self.fake.sentence(),
+                        created=self.random_date(),
+                    )
+                    for post in targets[start:start + BATCH_SIZE]
+                ])
+        return count
+
+    def create_follows(self, users, average, alpha):
+        weights = power_law_weights(len(users), alpha)
+        pairs = set()
+        for user in users:
+            # число подписок тоже с тяжелым хвостом
+            wanted = min(
+                int(self.random.paretovariate(1.5) * average / 3),
+                len(users) - 1
+            )
+            for author in self.random.choices(users, weights, k=wanted):
+                if author != user:
+                    pairs.add((user, author))
+        pairs = list(pairs)
+        for start in range(0, len(pairs), BATCH_SIZE):
+            self.bulk(Follow, [
+                Follow(user_id=user, author_id=author)
+                for user, author in pairs[start:start + BATCH_SIZE]
+            ])
+        return len(pairs)
@@ -0,0 +1,56 @@
+import time
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand
+
+from posts import images, thumbnails
+from posts.models import Post
+from posts.signals import bump_post_pages
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает миниатюры всех размеров для картинок из media/posts '
+        'в пуле процессов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Обрабатывать и картинки с готовыми миниатюрами'
+        )
+
+    def handle(self, *args, workers, force, **options):
+        names = list(images.stored_files())
+        if not force:
+            names = [
+                name for name in names
+                if any(
+                    thumbnails.ready(name, size) is None
+                    for size in thumbnails.thumbnail_sizes()
+                )
+            ]
+        started = time.perf_counter()
+        done = []
+        with thumbnails.make_executor(workers) as pool:
+            futures = {
+                pool.submit(thumbnails.generate, name): name
+                for name in names
+            }
+            for future in as_completed(futures):
+                if future.exception() is None:
+                    done.append(futures[future])
+                else:
+                    self.stderr.write(
+                        f'{futures[future]}: {future.exception()!r}'
+                    )
+        # как после фоновой задачи: заглушки меняются на миниатюры
+        # в карточках, на главной, в группах, профилях и лентах
+        bump_post_pages(*Post.objects.filter(image__in=done).values_list(
+            'pk', flat=True
+        ))
+        self.stdout.write(
+            f'Картинок: {len(done)} из {len(names)} '
+            f'за {time.perf_counter() - started:.1f} с'
+        )
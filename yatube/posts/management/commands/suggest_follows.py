@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рекомендации «кого почитать» (друзья друзей) '
+        'для пользователей, чьи подписки поменялись'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать всех, например после bulk_import'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help='Рекомендаций на пользователя (FOLLOW_SUGGESTIONS)'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = suggestions.recompute(options['full'], options['limit'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано пользователей: {count} '
+            f'за {time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,61 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Group = apps.get_model('posts', 'Group')
+    Comment = apps.get_model('posts', 'Comment')
+    AuthorCounter = apps.get_model('posts', 'AuthorCounter')
+    authors = Post.objects.order_by().values('author').annotate(
+        total=models.Count('pk')
+    )
+    AuthorCounter.objects.bulk_create(
+        AuthorCounter(author_id=row['author'], posts_count=row['total'])
+        for row in authors
+    )
+    groups = Post.objects.filter(group__isnull=False).order_by().values(
+        'group'
+    ).annotate(total=models.Count('pk'))
+    for row in groups:
+        Group.objects.filter(pk=row['group']).update(posts_count=row['total'])
+    posts = Comment.objects.order_by().values('post').annotate(
+        total=models.Count('pk')
+    )
+    for row in posts:
+        Post.objects.filter(pk=row['post']).update(comments_count=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0008_post_pub_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorCounter',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='post_counter', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Количество постов')),
+            ],
+            options={
+                'verbose_name': 'Счетчики автора',
+            },
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество постов'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
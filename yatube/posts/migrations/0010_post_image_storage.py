@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:22
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='original',
+            field=models.ImageField(blank=True, editable=False, help_text='Загруженный файл до перекодирования', storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Исходная картинка'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Добавьте к посту картинку', storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.db import models
 from django.contrib.auth import get_user_model
 
 from core.models import CreatedModel
+from core.storage import ContentAddressedStorage
 
 
 User = get_user_model()
@@ -31,25 +32,76 @@ class Post(CreatedModel):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
         help_text='Добавьте к посту картинку'
     )
+    original = models.ImageField(
+        'Исходная картинка',
+        upload_to='posts/',
+        storage=ContentAddressedStorage(),
+        blank=True,
+        editable=False,
+        help_text='Загруженный файл до перекодирования'
+    )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False
+    )
 
     def __str__(self):
         return self.text[:15]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # группа и картинка на момент загрузки нужны сигналам,
+        # чтобы заметить перенос поста в другую группу и новую картинку
+        instance._loaded_group_id = instance.__dict__.get('group_id')
+        instance._loaded_image = instance.__dict__.get('image')
+        return instance
+
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            # keyset-пагинация главной страницы по (pub_date, id)
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_id_idx'
+            ),
+            # ленты автора и группы: диапазон индекса в нужном порядке
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+        ]
 
 
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(
+        'Количество постов',
+        default=0,
+        editable=False
+    )
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # по старому slug закэшированы страницы, которые надо сбросить
+        instance._loaded_slug = instance.__dict__.get('slug')
+        return instance
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -79,6 +131,17 @@ class Comment(models.Model):
     class Meta:
         ordering = ['-created']
         verbose_name = 'Комментарий'
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx'
+            ),
+            # свежие комментарии для пересчета популярных постов
+            models.Index(
+                fields=['created'],
+                name='comment_created_idx'
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -97,3 +160,158 @@ class Follow(models.Model):
 
     def __str__(self):
         return self.text[:15]
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow'
+            ),
+        ]
+
+
+class AuthorCounter(models.Model):
+    """Счетчики автора, которые обновляются при записи."""
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='post_counter',
+        verbose_name='Автор'
+    )
+    posts_count = models.PositiveIntegerField(
+        'Количество постов',
+        default=0
+    )
+
+    def __str__(self):
+        return f'{self.author_id}: {self.posts_count}'
+
+    class Meta:
+        verbose_name = 'Счетчики автора'
+
+
+class FeedItem(models.Model):
+    """Запись материализованной ленты подписок.
+
+    Заполняется при публикации поста и при подписке,
+    чтобы страница подписок читалась одним диапазоном индекса.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+    class Meta:
+        ordering = ['-pub_date']
+        verbose_name = 'Запись ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_item'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_user_author_idx'
+            ),
+        ]
+
+
+class FollowSuggestion(models.Model):
+    """Кандидат в подписки: автор, на которого подписаны подписки
+    пользователя. Заполняется пакетно (posts.suggestions)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='follow_suggestions',
+        verbose_name='Пользователь'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Предложенный автор'
+    )
+    rank = models.PositiveSmallIntegerField('Место')
+    mutual_count = models.PositiveIntegerField('Общих подписок')
+
+    def __str__(self):
+        return f'{self.user_id}: {self.author_id}'
+
+    class Meta:
+        ordering = ['user', 'rank']
+        verbose_name = 'Рекомендация подписки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'rank'],
+                name='unique_suggestion_rank'
+            ),
+        ]
+
+
+class StaleSuggestions(models.Model):
+    """Отметка: подписки пользователя поменялись, и рекомендации
+    его и его подписчиков нужно пересчитать."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+        verbose_name='Пользователь'
+    )
+
+    def __str__(self):
+        return str(self.user_id)
+
+    class Meta:
+        verbose_name = 'Устаревшие рекомендации'
+
+
+class TrendingScore(models.Model):
+    """Популярность поста с затуханием по времени (posts.trending).
+
+    score — логарифм суммы весов событий, умноженных на e^(t / tau),
+    поэтому порядок по score совпадает с порядком по текущей
+    популярности, и строки без новых событий пересчитывать не нужно.
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Пост'
+    )
+    score = models.FloatField('Популярность')
+
+    def __str__(self):
+        return f'{self.post_id}: {self.score:.3f}'
+
+    class Meta:
+        verbose_name = 'Популярность поста'
+        indexes = [
+            models.Index(fields=['-score'], name='trending_score_idx'),
+        ]
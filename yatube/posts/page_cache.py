@@ -0,0 +1,187 @@
+"""Кэш страниц лент с инвалидацией по событиям.
+
+Страница хранится в кэше вместе с поколением (generation) своей ленты.
+Сигналы Post меняют поколение, и закэшированная страница становится
+устаревшей. У каждой группы своя лента (group_scope), так что пост
+в одной группе не сбрасывает страницы остальных. Устаревшую страницу
+пересобирает только один запрос, остальные в это время получают
+предыдущую версию (stale-while-revalidate).
+"""
+import datetime
+import hashlib
+import time
+import uuid
+from functools import wraps
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+
+def page_timeout():
+    return getattr(settings, 'FEED_PAGE_CACHE_TIMEOUT', 60 * 60)
+
+
+def rebuild_timeout():
+    return getattr(settings, 'FEED_PAGE_REBUILD_TIMEOUT', 10)
+
+
+def _scope_key(scope):
+    # слаги старых групп бывают с пробелами и кириллицей,
+    # а ключ кэша должен подходить и для memcached
+    return quote(scope, safe=':')
+
+
+def _generation_key(scope):
+    return f'feed:gen:{_scope_key(scope)}'
+
+
+def _new_generation():
+    # время смены в миллисекундах: из него же берется Last-Modified
+    return f'{time.time_ns() // 1000000:x}.{uuid.uuid4().hex[:6]}'
+
+
+def generation(scope):
+    '''Текущее поколение ленты; если его нет в кэше — создается новое'''
+    key = _generation_key(scope)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _new_generation(), None)
+        value = cache.get(key)
+    return value
+
+
+def changed_at(scope):
+    '''Время последней смены поколения ленты (UTC)'''
+    stamp = generation(scope).split('.')[0]
+    return datetime.datetime.fromtimestamp(
+        int(stamp, 16) / 1000, datetime.timezone.utc
+    )
+
+
+def generations(scopes):
+    '''Поколения нескольких лент одним обращением к кэшу'''
+    keys = {_generation_key(scope): scope for scope in scopes}
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            values[key] = generation(keys[key])
+    return [values[key] for key in keys]
+
+
+def bump(scope):
+    '''Объявляет все закэшированные страницы ленты устаревшими'''
+    cache.set(_generation_key(scope), _new_generation(), None)
+
+
+def bump_many(scopes):
+    '''bump для многих лент одной записью в кэш'''
+    value = _new_generation()
+    cache.set_many({_generation_key(scope): value for scope in scopes}, None)
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def feed_scope(user_id):
+    '''Лента подписок пользователя'''
+    return f'feed:{user_id}'
+
+
+def follows_scope(user_id):
+    '''Подписки пользователя: от них зависят кнопки на его страницах'''
+    return f'follows:{user_id}'
+
+
+def _viewer(request, shared):
+    '''Чья копия страницы: общая для оболочек personal_page
+       и ответов без личного (shared)'''
+    # личное в оболочку подставляет posts.fragments; без нее страница
+    # может содержать шапку посетителя, и копия у каждого своя
+    if shared or getattr(request, 'page_shell', False):
+        return 'shell'
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return 'anon'
+    return f'user{user.pk}'
+
+
+def _page_key(scope, request, shared=False):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    viewer = _viewer(request, shared)
+    return f'feed:page:{_scope_key(scope)}:{viewer}:{path}'
+
+
+def _response(entry):
+    response = HttpResponse(
+        entry['content'], content_type=entry['content_type']
+    )
+    response['X-Feed-Cache'] = entry['state']
+    return response
+
+
+def _scope_name(scope, request, kwargs):
+    '''Лента запроса или None, если ответ не кэшируется'''
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    if callable(scope):
+        return scope(request, **kwargs)
+    return scope.format(**kwargs)
+
+
+def cache_feed(scope, version=None, shared=False):
+    '''Кэширует GET-ответы view до смены поколения ленты scope.
+
+    scope может ссылаться на аргументы view: 'group:{slug}',
+    или быть функцией (request, **kwargs) -> scope; если она вернула
+    None, ответ не кэшируется. Под декоратором personal_page копия
+    страницы одна на всех посетителей и личное в ней выводится через
+    posts.fragments, без него у каждого посетителя своя копия.
+    shared=True — ответ не зависит от посетителя (например, JSON API).
+    version(request, scope) заменяет поколение ленты, если страница
+    зависит еще от чего-то, например от лент популярных авторов.
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            scope_name = _scope_name(scope, request, kwargs)
+            if scope_name is None:
+                return view(request, *args, **kwargs)
+            current = (
+                version(request, scope_name) if version
+                else generation(scope_name)
+            )
+            key = _page_key(scope_name, request, shared)
+            entry = cache.get(key)
+            lock = None
+            if entry is not None:
+                if entry['generation'] == current:
+                    return _response(dict(entry, state='hit'))
+                # пересобирает один запрос, остальные отдают старую версию
+                lock = f'{key}:rebuild'
+                if not cache.add(lock, 1, rebuild_timeout()):
+                    return _response(dict(entry, state='stale'))
+            try:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.streaming:
+                    if hasattr(response, 'render'):
+                        response.render()
+                    cache.set(key, {
+                        'generation': current,
+                        'content': response.content,
+                        'content_type': response['Content-Type'],
+                    }, page_timeout())
+            finally:
+                # и после ошибки следующий запрос пересоберет страницу
+                if lock:
+                    cache.delete(lock)
+            response['X-Feed-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,135 @@
+"""Полнотекстовый поиск по постам (SQLite FTS5).
+
+Индекс posts_post_fts — внешняя таблица FTS5 над posts_post(text),
+его синхронизируют триггеры из миграции 0011_post_search, поэтому
+он не отстает и от queryset.update(), и от bulk_create.
+
+Стеммера для русского в FTS5 нет, поэтому слова запроса
+обрезаются до основы (отбрасываются типичные окончания)
+и ищутся как префиксы: «стихами» → стих*, найдутся «стих», «стихи»,
+«стихотворение».
+На других СУБД поиск сводится к icontains.
+"""
+import re
+
+from django.db import connection
+
+
+FTS_TABLE = 'posts_post_fts'
+WORD = re.compile(r'\w+')
+# окончания — от длинных к коротким, чтобы снималось самое длинное
+ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими',
+    'ией', 'иях', 'ях', 'ах', 'ов', 'ев', 'ей', 'ой', 'ий', 'ый',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ом', 'ем', 'ам', 'ям', 'ую',
+    'юю', 'ть', 'ешь', 'ет', 'ют', 'ут', 'ит', 'ат', 'ят', 'ла', 'ли',
+    'ло', 'ся', 'сь', 'а', 'я', 'о', 'е', 'у', 'ю', 'ы', 'и', 'ь', 'й',
+), key=len, reverse=True)
+MIN_STEM = 3
+MAX_TERMS = 16
+
+
+def available():
+    return connection.vendor == 'sqlite'
+
+
+def rebuild():
+    '''Пересобирает индекс по всей таблице posts_post'''
+    if available():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')"
+            )
+
+
+def stem(word):
+    '''Основа слова для префиксного поиска'''
+    word = word.lower()
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def match_expression(query):
+    '''Строка для MATCH: все основы слов запроса как префиксы (И)'''
+    terms = []
+    for word in WORD.findall(query)[:MAX_TERMS]:
+        base = stem(word).replace('"', '')
+        if base:
+            terms.append(f'"{base}"*')
+    return ' '.join(terms)
+
+
+def filter_matching(queryset, query):
+    '''Посты из queryset, подходящие под запрос (без ранга)'''
+    if not match_expression(query):
+        return queryset.none()
+    return queryset.extra(
+        where=[
+            f'posts_post.id IN (SELECT rowid FROM {FTS_TABLE}'
+            f' WHERE {FTS_TABLE} MATCH %s)'
+        ],
+        params=[match_expression(query)],
+    )
+
+
+class SearchResults:
+    '''Найденные посты для Paginator, самые релевантные первыми (bm25).
+
+    Количество считается через rowid IN (подзапрос к индексу), а страница
+    выбирается соединением с индексом и сортировкой по рангу. В одном
+    запросе для COUNT планировщик SQLite перебирал бы посты и проверял
+    MATCH для каждой строки отдельно.
+    '''
+
+    def __init__(self, queryset, query):
+        self.queryset = queryset
+        self.query = query
+        self.expression = match_expression(query)
+
+    def filtered(self):
+        '''Подходящие посты без сортировки по рангу'''
+        if not available():
+            return _like(self.queryset, self.query)
+        return filter_matching(self.queryset, self.query)
+
+    def ranked(self):
+        '''Подходящие посты по убыванию релевантности'''
+        if not self.expression or not available():
+            return self.filtered().order_by('-pub_date', '-pk')
+        return self.queryset.extra(
+            tables=[FTS_TABLE],
+            where=[
+                f'{FTS_TABLE}.rowid = posts_post.id',
+                f'{FTS_TABLE} MATCH %s',
+            ],
+            params=[self.expression],
+            select={'rank': f'bm25({FTS_TABLE})'},
+            order_by=['rank', '-pub_date'],
+        )
+
+    def count(self):
+        return self.filtered().count()
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self.ranked())
+
+    def __getitem__(self, index):
+        return self.ranked()[index]
+
+
+def _like(queryset, query):
+    if not match_expression(query):
+        return queryset.none()
+    for word in WORD.findall(query)[:MAX_TERMS]:
+        queryset = queryset.filter(text__icontains=stem(word))
+    return queryset
+
+
+def search(queryset, query):
+    '''Посты из queryset, подходящие под поисковый запрос'''
+    return SearchResults(queryset, query)
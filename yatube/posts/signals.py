@@ -0,0 +1,230 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from posts import (
+    cards, counters, feed, follow_graph, page_cache, suggestions,
+    thumbnails, trending,
+)
+from posts.models import Comment, Follow, Group, Post, User
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, raw=False, **kwargs):
+    '''Новый пост попадает в ленты подписчиков автора'''
+    if created and not raw:
+        feed.fan_out_post(instance)
+
+
+def bump_group_pages(*group_ids):
+    slugs = Group.objects.filter(
+        pk__in={pk for pk in group_ids if pk is not None}
+    ).values_list('slug', flat=True)
+    for slug in slugs:
+        page_cache.bump(page_cache.group_scope(slug))
+
+
+# подключен раньше count_saved_post: тот обновляет _loaded_group_id
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_group_pages(sender, instance, raw=False, **kwargs):
+    '''Страницы группы поста (и прежней группы при переносе)
+       пересобираются, остальные группы не затрагиваются'''
+    if not raw:
+        bump_group_pages(
+            getattr(instance, '_loaded_group_id', None), instance.group_id
+        )
+        page_cache.bump(page_cache.author_scope(instance.author_id))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_follower_feeds(sender, instance, raw=False, **kwargs):
+    '''Правка и удаление поста сбрасывают ленты подписчиков автора;
+       новый пост сбрасывает их при раскладке (fan_out_new_post)'''
+    if not raw and not kwargs.get('created'):
+        feed.bump_follower_feeds(instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw=False, **kwargs):
+    '''Счетчики постов автора и группы'''
+    if raw:
+        return
+    old_group_id = getattr(instance, '_loaded_group_id', None)
+    if created:
+        counters.change_author_posts(instance.author_id, 1)
+        counters.change_group_posts(instance.group_id, 1)
+    elif old_group_id != instance.group_id:
+        counters.change_group_posts(old_group_id, -1)
+        counters.change_group_posts(instance.group_id, 1)
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_author_posts(instance.author_id, -1)
+    counters.change_group_posts(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw=False, **kwargs):
+    '''Счетчик комментариев поста'''
+    if created and not raw:
+        counters.change_post_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_post_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def trend_new_post(sender, instance, created, raw=False, **kwargs):
+    '''Новый пост сразу попадает в популярные с весом публикации'''
+    if created and not raw:
+        trending.add(instance.pk, trending.POST_WEIGHT, instance.pub_date)
+
+
+@receiver(post_save, sender=Comment)
+def trend_new_comment(sender, instance, created, raw=False, **kwargs):
+    '''Комментарий поднимает пост в популярных'''
+    if created and not raw:
+        trending.add(
+            instance.post_id, trending.COMMENT_WEIGHT, instance.created
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def trend_deleted_comment(sender, instance, **kwargs):
+    trending.remove(
+        instance.post_id, trending.COMMENT_WEIGHT, instance.created
+    )
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_follower_pages(sender, instance, raw=False, **kwargs):
+    '''Кнопки подписки на страницах читателя поменялись,
+       а в профилях обоих — число подписок и подписчиков'''
+    if not raw:
+        follow_graph.changed(instance.user_id, instance.author_id)
+        page_cache.bump(page_cache.follows_scope(instance.user_id))
+        page_cache.bump(page_cache.feed_scope(instance.user_id))
+        page_cache.bump(page_cache.author_scope(instance.user_id))
+        page_cache.bump(page_cache.author_scope(instance.author_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def mark_stale_suggestions(sender, instance, raw=False, **kwargs):
+    '''Второй уровень графа поменялся у читателя и его подписчиков:
+       suggest_follows пересчитает их рекомендации'''
+    if not raw:
+        suggestions.mark_stale(instance.user_id)
+
+
+@receiver(post_save, sender=Follow)
+def fill_feed_on_follow(sender, instance, created, raw=False, **kwargs):
+    '''После подписки в ленте появляются посты автора'''
+    if created and not raw:
+        feed.followers_changed(instance.author_id, followed=True)
+        feed.add_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clear_feed_on_unfollow(sender, instance, **kwargs):
+    '''После отписки посты автора пропадают из ленты'''
+    feed.remove_author(instance.user_id, instance.author_id)
+    feed.followers_changed(instance.author_id, followed=False)
+
+
+@receiver(post_save, sender=Post)
+def bump_post_card(sender, instance, raw=False, **kwargs):
+    '''Текст, группа или картинка поста поменялись — карточка устарела'''
+    if not raw:
+        cards.bump('post', instance.pk)
+
+
+@receiver(post_save, sender=User)
+def bump_author_cards(sender, instance, raw=False, update_fields=None,
+                      **kwargs):
+    '''Имя автора выводится в карточках всех его постов'''
+    if raw or update_fields == frozenset({'last_login'}):
+        return
+    cards.bump('user', instance.pk)
+    if kwargs.get('created'):
+        return
+    # страницы лент хранят уже собранный HTML с именем автора
+    page_cache.bump('index')
+    page_cache.bump(page_cache.author_scope(instance.pk))
+    feed.bump_follower_feeds(instance.pk)
+    bump_group_pages(*Post.objects.filter(
+        author=instance, group__isnull=False
+    ).values_list('group', flat=True).distinct())
+
+
+@receiver(post_save, sender=Group)
+def bump_group_cards(sender, instance, raw=False, **kwargs):
+    '''Название и ссылка группы выводятся в карточках ее постов'''
+    if raw:
+        return
+    cards.bump('group', instance.pk)
+    page_cache.bump(page_cache.group_scope(instance.slug))
+    loaded_slug = getattr(instance, '_loaded_slug', None)
+    if loaded_slug and loaded_slug != instance.slug:
+        page_cache.bump(page_cache.group_scope(loaded_slug))
+    if kwargs.get('created'):
+        return
+    # главная, профили и ленты хранят уже собранный HTML с группой
+    page_cache.bump('index')
+    authors = Post.objects.filter(group=instance).order_by().values_list(
+        'author', flat=True
+    ).distinct()
+    for author_id in authors:
+        page_cache.bump(page_cache.author_scope(author_id))
+        feed.bump_follower_feeds(author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_index(sender, instance, raw=False, **kwargs):
+    '''Главная страница пересобирается после изменений постов'''
+    if not raw:
+        page_cache.bump('index')
+
+
+@receiver(post_save, sender=Post)
+def queue_thumbnails(sender, instance, raw=False, **kwargs):
+    '''Новая картинка уходит на обработку после коммита'''
+    name = instance.image.name
+    if raw or not name or name == getattr(instance, '_loaded_image', None):
+        return
+    instance._loaded_image = name
+    transaction.on_commit(
+        lambda: thumbnails.schedule(instance.pk, name, reencode=True)
+    )
+
+
+def bump_post_pages(*post_ids):
+    '''Карточки постов и все страницы, на которых они выводятся'''
+    for post_id in post_ids:
+        cards.bump('post', post_id)
+    page_cache.bump('index')
+    rows = Post.objects.filter(pk__in=post_ids).values_list(
+        'group', 'author'
+    )
+    groups = {group_id for group_id, _ in rows}
+    authors = {author_id for _, author_id in rows}
+    bump_group_pages(*groups)
+    page_cache.bump_many(
+        page_cache.author_scope(author_id) for author_id in authors
+    )
+    for author_id in authors:
+        feed.bump_follower_feeds(author_id)
+
+
+@receiver(thumbnails.thumbnail_ready)
+def bump_thumbnail_pages(sender, post_id, **kwargs):
+    '''Карточки и страницы с заглушкой меняются на готовую миниатюру'''
+    bump_post_pages(post_id)
@@ -0,0 +1,190 @@
+"""Рекомендации «кого почитать»: авторы, на которых подписаны подписки.
+
+Считать их запросом к Follow на каждой странице слишком дорого,
+поэтому их пересчитывает команда suggest_follows. Граф подписок
+выгружается в разреженную матрицу смежности в формате CSR — два
+массива array: indptr и indices. Кандидаты пользователя — сумма строк
+его подписок; ранжируются по числу общих подписок, при равенстве —
+по дате последнего поста автора. Первые FOLLOW_SUGGESTIONS кандидатов
+записываются в FollowSuggestion, страница читает их одним запросом.
+
+Подписка и отписка отмечают читателя в StaleSuggestions. Без --full
+пересчитываются только отмеченные пользователи и их подписчики:
+у остальных второй уровень графа не поменялся.
+"""
+import heapq
+from array import array
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+
+from posts import follow_graph, page_cache
+from posts.models import (
+    Follow, FollowSuggestion, Post, StaleSuggestions, User,
+)
+
+
+CHUNK_SIZE = 500
+
+
+def suggestions_count():
+    return getattr(settings, 'FOLLOW_SUGGESTIONS', 10)
+
+
+class FollowGraph:
+    '''Матрица смежности подписок в формате CSR.
+
+    Подписки пользователя u — indices[indptr[u]:indptr[u + 1]],
+    по возрастанию id автора. Строки идут по id пользователя.
+    '''
+
+    def __init__(self, indptr, indices):
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def from_edges(cls, edges, size):
+        '''Граф из пар (user, author), упорядоченных по user'''
+        indptr = array('L', [0]) * (size + 1)
+        indices = array('L')
+        for user, author in edges:
+            indices.append(author)
+            indptr[user + 1] += 1
+        for row in range(size):
+            indptr[row + 1] += indptr[row]
+        return cls(indptr, indices)
+
+    @classmethod
+    def load(cls):
+        size = (User.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+        edges = Follow.objects.order_by('user', 'author').values_list(
+            'user', 'author'
+        )
+        return cls.from_edges(edges.iterator(chunk_size=10000), size)
+
+    @property
+    def size(self):
+        return len(self.indptr) - 1
+
+    def row(self, user_id):
+        if user_id >= self.size:
+            return self.indices[:0]
+        return self.indices[self.indptr[user_id]:self.indptr[user_id + 1]]
+
+    def users(self):
+        '''id пользователей хотя бы с одной подпиской'''
+        return [
+            user for user in range(self.size)
+            if self.indptr[user] != self.indptr[user + 1]
+        ]
+
+
+def latest_posts():
+    '''Время последнего поста каждого автора: {author_id: timestamp}'''
+    return {
+        author: last.timestamp()
+        for author, last in Post.objects.order_by().values(
+            'author'
+        ).annotate(last=Max('pub_date')).values_list('author', 'last')
+    }
+
+
+def candidates(graph, user_id, recency, limit):
+    '''Лучшие limit пар (автор, число общих подписок)'''
+    followees = graph.row(user_id)
+    mutual = Counter()
+    for followee in followees:
+        mutual.update(graph.row(followee))
+    for author in (user_id, *followees):
+        mutual.pop(author, None)
+    return heapq.nlargest(
+        limit, mutual.items(),
+        key=lambda item: (item[1], recency.get(item[0], 0))
+    )
+
+
+def store(results):
+    '''Заменяет рекомендации пользователей: {user_id: [(author, n)]}'''
+    with transaction.atomic():
+        FollowSuggestion.objects.filter(user__in=list(results)).delete()
+        FollowSuggestion.objects.bulk_create([
+            FollowSuggestion(
+                user_id=user_id, author_id=author, rank=rank,
+                mutual_count=mutual,
+            )
+            for user_id, rows in results.items()
+            for rank, (author, mutual) in enumerate(rows)
+        ])
+    for user_id in results:
+        # рекомендации выводятся на страницах пользователя
+        page_cache.bump(page_cache.follows_scope(user_id))
+
+
+def _stale_users(stale):
+    '''Отмеченные пользователи и их подписчики'''
+    users = set(stale)
+    for start in range(0, len(stale), CHUNK_SIZE):
+        users.update(Follow.objects.filter(
+            author__in=stale[start:start + CHUNK_SIZE]
+        ).values_list('user', flat=True))
+    return users
+
+
+def recompute(full=False, limit=None):
+    '''Пересчитывает рекомендации; возвращает число пользователей'''
+    limit = limit or suggestions_count()
+    stale = list(StaleSuggestions.objects.values_list('user', flat=True))
+    if full:
+        graph = FollowGraph.load()
+        users = set(graph.users()) | set(
+            FollowSuggestion.objects.values_list('user', flat=True)
+        )
+    elif stale:
+        users = _stale_users(stale)
+        graph = FollowGraph.load()
+    else:
+        return 0
+    recency = latest_posts()
+    users = sorted(users)
+    for start in range(0, len(users), CHUNK_SIZE):
+        store({
+            user_id: candidates(graph, user_id, recency, limit)
+            for user_id in users[start:start + CHUNK_SIZE]
+        })
+    # отметки, появившиеся во время пересчета, дождутся следующего
+    for start in range(0, len(stale), CHUNK_SIZE):
+        StaleSuggestions.objects.filter(
+            user__in=stale[start:start + CHUNK_SIZE]
+        ).delete()
+    return len(users)
+
+
+def mark_stale(*user_ids):
+    StaleSuggestions.objects.bulk_create(
+        [StaleSuggestions(user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True
+    )
+
+
+def for_user(user, limit=None):
+    '''Рекомендованные авторы: один запрос, потом из кэша до пересчета
+       или смены подписок пользователя. Авторы, на которых он
+       подписался после пересчета, пропускаются'''
+    if not user.is_authenticated:
+        return []
+    limit = limit or suggestions_count()
+    version = page_cache.generation(page_cache.follows_scope(user.pk))
+    key = f'suggestions:{user.pk}:{limit}:{version}'
+    authors = cache.get(key)
+    if authors is None:
+        authors = [
+            row.author for row in FollowSuggestion.objects.filter(
+                user=user
+            ).select_related('author')[:limit]
+        ]
+        cache.set(key, authors, page_cache.page_timeout())
+    followed = set(follow_graph.followees(user))
+    return [author for author in authors if author.pk not in followed]
@@ -0,0 +1,19 @@
+from django import template
+
+from posts import fragments
+
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def personal(context, name):
+    '''Личный фрагмент страницы (posts.fragments).
+
+    В общей оболочке закэшированной страницы вместо него
+    остается метка, остальные страницы рисуют его на месте.
+    '''
+    request = context['request']
+    if fragments.is_shell(request):
+        return fragments.placeholder(name)
+    return fragments.render(name, request)
@@ -0,0 +1,23 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts.cards import render_cards
+
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    '''Карточка поста из кэша фрагментов.
+
+    При первом вызове карточки всей страницы page_obj
+    читаются из кэша одним запросом.
+    '''
+    cards = context.render_context.setdefault('post_cards', {})
+    if post.pk not in cards:
+        page = list(context.get('page_obj') or ())
+        if post not in page:
+            page = [post]
+        cards.update(render_cards(page))
+    return mark_safe(cards[post.pk])
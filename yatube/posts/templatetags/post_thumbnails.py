@@ -0,0 +1,46 @@
+from django import template
+from django.db import transaction
+
+from posts import thumbnails
+
+
+register = template.Library()
+
+
+def _page_posts(context, post):
+    '''Посты, миниатюры которых стоит прочитать вместе с этой'''
+    posts = list(
+        context.get('thumbnail_posts') or context.get('page_obj') or ()
+    )
+    if post not in posts:
+        posts = [post]
+    return posts
+
+
+@register.simple_tag(takes_context=True)
+def post_thumbnail(context, post, size='card'):
+    '''Готовая миниатюра картинки поста или None.
+
+    При первом вызове миниатюры всех постов страницы читаются
+    одним запросом. Если миниатюры еще нет, ее генерация ставится
+    в очередь, а шаблон показывает заглушку.
+    '''
+    if not post.image:
+        return None
+    name = post.image.name
+    # карточки рисуются отдельными render и делят словарь через контекст
+    shared = context.get('post_thumbnails')
+    if shared is None:
+        shared = context.render_context.setdefault('post_thumbnails', {})
+    found = shared.setdefault(size, {})
+    if name not in found:
+        names = [
+            item.image.name for item in _page_posts(context, post)
+            if item.image
+        ]
+        ready = thumbnails.ready_many(names, size)
+        found.update({name: ready.get(name) for name in names})
+    image = found.get(name)
+    if image is None:
+        transaction.on_commit(lambda: thumbnails.schedule(post.pk, name))
+    return image
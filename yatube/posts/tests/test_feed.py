@@ -0,0 +1,309 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import feed, follow_graph, suggestions
+from posts.models import (
+    Comment, FeedItem, Follow, FollowSuggestion, Group, Post,
+    StaleSuggestions,
+)
+
+User = get_user_model()
+
+
+class FollowFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Feed_author')
+        cls.reader = User.objects.create_user(username='Feed_reader')
+        cls.old_post = Post.objects.create(
+            text='Пост до подписки',
+            author=cls.author
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def feed_posts(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_fills_feed(self):
+        '''Подписка добавляет в ленту уже опубликованные посты автора'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertTrue(FeedItem.objects.filter(
+            user=self.reader, post=self.old_post).exists())
+        self.assertEqual(self.feed_posts(), [self.old_post])
+
+    def test_new_post_fans_out(self):
+        '''Новый пост автора раскладывается по лентам подписчиков'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(self.feed_posts(), [post, self.old_post])
+
+    def test_unfollow_clears_feed(self):
+        '''После отписки посты автора пропадают из ленты'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.filter(user=self.reader, author=self.author).delete()
+        self.assertFalse(FeedItem.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed_posts(), [])
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_celebrity_posts_merged_on_read(self):
+        '''Посты популярного автора не раскладываются,
+           но подмешиваются в ленту при чтении'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        cache.clear()
+        post = Post.objects.create(text='Пост звезды', author=self.author)
+        self.assertFalse(FeedItem.objects.filter(post=post).exists())
+        self.assertEqual(self.feed_posts(), [post, self.old_post])
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_author_crossing_fanout_limit(self):
+        '''Автор, вернувшийся под порог, дописывает ленты подписчиков
+           постами и подписками того времени, когда был популярен'''
+        first = User.objects.create_user(username='Feed_first')
+        second = User.objects.create_user(username='Feed_second')
+        Follow.objects.create(user=first, author=self.author)
+        Follow.objects.create(user=second, author=self.author)
+        self.assertIn(self.author.pk, feed.celebrities())
+        post = Post.objects.create(text='Пост звезды', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertFalse(FeedItem.objects.filter(post=post).exists())
+        self.assertEqual(self.feed_posts(), [post, self.old_post])
+        Follow.objects.filter(author=self.author).exclude(
+            user=self.reader
+        ).delete()
+        self.assertNotIn(self.author.pk, feed.celebrities())
+        self.assertEqual(set(FeedItem.objects.filter(
+            user=self.reader).values_list('post', flat=True)),
+            {post.pk, self.old_post.pk})
+        self.assertEqual(self.feed_posts(), [post, self.old_post])
+        Follow.objects.create(user=first, author=self.author)
+        Follow.objects.create(user=second, author=self.author)
+        self.assertIn(self.author.pk, feed.celebrities())
+        self.assertEqual(self.feed_posts(), [post, self.old_post])
+
+    def test_backfill_feed_command(self):
+        '''backfill_feed восстанавливает ленты по подпискам'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        FeedItem.objects.all().delete()
+        call_command('backfill_feed', stdout=StringIO())
+        self.assertEqual(self.feed_posts(), [self.old_post])
+
+    def test_repeated_follow_keeps_one_row(self):
+        '''Повторная подписка не создает вторую запись'''
+        url = reverse('posts:profile_follow', args=[self.author.username])
+        self.authorized_client.get(url)
+        self.authorized_client.get(url)
+        self.assertEqual(Follow.objects.filter(
+            user=self.reader, author=self.author).count(), 1)
+
+    def test_explain_feeds_command(self):
+        '''Запросы лент читают индексы, а не таблицы целиком'''
+        group = Group.objects.create(title='Группа', slug='explain')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=self.author, group=group)
+            for i in range(12)
+        )
+        Comment.objects.create(
+            post=self.old_post, author=self.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        out = StringIO()
+        call_command('explain_feeds', '--quiet', stdout=out)
+        self.assertIn('Все планы используют индексы', out.getvalue())
+
+
+class FollowGraphTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Graph_author')
+        cls.other = User.objects.create_user(username='Graph_other')
+        cls.reader = User.objects.create_user(username='Graph_reader')
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def following(self, author):
+        response = self.authorized_client.get(
+            reverse('posts:profile', args=[author.username])
+        )
+        return response.context['following']
+
+    def test_profile_following_is_per_author(self):
+        '''Кнопка «Отписаться» только у авторов из подписок'''
+        self.authorized_client.get(
+            reverse('posts:profile_follow', args=[self.author.username])
+        )
+        self.assertTrue(self.following(self.author))
+        self.assertFalse(self.following(self.other))
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username])
+        )
+        self.assertFalse(self.following(self.author))
+
+    def test_cached_lookups_without_sql(self):
+        '''Повторные проверки подписки и счетчики не ходят в базу'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.other)
+        for user in (self.reader, self.author):
+            follow_graph.followees(user)
+        follow_graph.followers_count(self.author)
+        with self.assertNumQueries(0):
+            self.assertTrue(follow_graph.is_following(self.reader, self.other))
+            self.assertFalse(
+                follow_graph.is_following(self.author, self.reader)
+            )
+            self.assertEqual(follow_graph.followees_count(self.reader), 2)
+            self.assertEqual(follow_graph.followers_count(self.author), 1)
+
+    def test_reset_after_bulk_changes(self):
+        '''После записи в обход сигналов граф собирается заново'''
+        self.assertFalse(follow_graph.is_following(self.reader, self.author))
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.author)]
+        )
+        follow_graph.reset()
+        self.assertTrue(follow_graph.is_following(self.reader, self.author))
+
+
+class FollowSuggestionsTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.reader, cls.first, cls.second, cls.popular, cls.quiet = [
+            User.objects.create_user(username=f'Suggest_{name}')
+            for name in ('reader', 'first', 'second', 'popular', 'quiet')
+        ]
+        for user, author in [
+            (cls.reader, cls.first), (cls.reader, cls.second),
+            (cls.first, cls.popular), (cls.second, cls.popular),
+            (cls.first, cls.quiet), (cls.first, cls.reader),
+        ]:
+            Follow.objects.create(user=user, author=author)
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def suggested(self, user):
+        return list(FollowSuggestion.objects.filter(
+            user=user
+        ).values_list('author', 'mutual_count'))
+
+    def test_friends_of_friends_ranked(self):
+        '''Кандидаты второго уровня по числу общих подписок,
+           без самого пользователя и его подписок'''
+        suggestions.recompute(full=True)
+        self.assertEqual(
+            self.suggested(self.reader),
+            [(self.popular.pk, 2), (self.quiet.pk, 1)]
+        )
+        self.assertFalse(StaleSuggestions.objects.exists())
+
+    def test_recent_author_wins_tie(self):
+        '''При равном числе общих подписок выше автор со свежим постом'''
+        Follow.objects.create(user=self.second, author=self.quiet)
+        Post.objects.create(text='Свежий пост', author=self.quiet)
+        suggestions.recompute(full=True)
+        self.assertEqual(
+            self.suggested(self.reader),
+            [(self.quiet.pk, 2), (self.popular.pk, 2)]
+        )
+
+    def test_incremental_recompute_for_stale_neighbourhood(self):
+        '''Подписка пересчитывает читателя и его подписчиков'''
+        suggestions.recompute(full=True)
+        FollowSuggestion.objects.filter(user=self.first).delete()
+        Follow.objects.create(user=self.second, author=self.quiet)
+        self.assertEqual(suggestions.recompute(), 2)
+        self.assertEqual(
+            self.suggested(self.reader),
+            [(self.popular.pk, 2), (self.quiet.pk, 2)]
+        )
+        # у first второй уровень не поменялся, его не пересчитывали
+        self.assertEqual(self.suggested(self.first), [])
+        self.assertEqual(suggestions.recompute(), 0)
+
+    def test_pages_show_suggestions(self):
+        '''Рекомендации на страницах без уже подписанных авторов'''
+        suggestions.recompute(full=True)
+        Follow.objects.create(user=self.reader, author=self.quiet)
+        client = Client()
+        client.force_login(self.reader)
+        for url in (
+            reverse('posts:follow_index'),
+            reverse('posts:profile', args=[self.first.username]),
+        ):
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertEqual(
+                    response.context['suggestions'], [self.popular]
+                )
+
+
+class FollowFeedCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Cache_author')
+        cls.stranger = User.objects.create_user(username='Cache_stranger')
+        cls.reader = User.objects.create_user(username='Cache_reader')
+        cls.post = Post.objects.create(text='Пост автора', author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def get(self):
+        return self.authorized_client.get(reverse('posts:follow_index'))
+
+    def test_repeat_visit_without_feed_queries(self):
+        '''Повторный визит: только сессия и пользователь'''
+        self.get()
+        with self.assertNumQueries(2):
+            response = self.get()
+        self.assertEqual(response['X-Feed-Cache'], 'hit')
+        self.assertContains(response, 'Пост автора')
+
+    def test_followee_changes_invalidate(self):
+        '''Новый пост и правка у автора из подписок сбрасывают кэш'''
+        self.get()
+        Post.objects.create(text='Новый пост', author=self.author)
+        response = self.get()
+        self.assertEqual(response['X-Feed-Cache'], 'miss')
+        self.assertContains(response, 'Новый пост')
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        response = self.get()
+        self.assertEqual(response['X-Feed-Cache'], 'miss')
+        self.assertContains(response, 'Исправленный пост')
+
+    def test_other_authors_keep_cache(self):
+        '''Посты чужих авторов ленту не сбрасывают, подписка — да'''
+        self.get()
+        Post.objects.create(text='Чужой пост', author=self.stranger)
+        self.assertEqual(self.get()['X-Feed-Cache'], 'hit')
+        Follow.objects.create(user=self.reader, author=self.stranger)
+        response = self.get()
+        self.assertEqual(response['X-Feed-Cache'], 'miss')
+        self.assertContains(response, 'Чужой пост')
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_celebrity_post_invalidates(self):
+        '''Пост популярного автора виден, хотя ленты не сбрасывались'''
+        self.get()
+        Post.objects.create(text='Пост звезды', author=self.author)
+        self.assertContains(self.get(), 'Пост звезды')
@@ -1,13 +1,20 @@
+import hashlib
+import io
+import os
 import tempfile
 import shutil
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
 
 
+from posts import images, thumbnails
 from posts.forms import PostForm, CommentForm
 from posts.models import Group, Post
 
@@ -16,6 +23,12 @@ User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
+def hashed_name(content, extension):
+    '''Имя файла в хранилище картинок: по хэшу содержимого'''
+    digest = hashlib.sha256(content).hexdigest()
+    return f'posts/{digest[:2]}/{digest[2:4]}/{digest}.{extension}'
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class CreateNewPostForm(TestCase):
     @classmethod
@@ -85,7 +98,8 @@ class CreateNewPostForm(TestCase):
         post = Post.objects.get()
         self.assertEqual(post.text, self.form_data['text'])
         self.assertEqual(post.group.id, self.form_data['group'])
-        self.assertEqual(post.image.name, 'posts/small.gif')
+        self.assertEqual(
+            post.image.name, hashed_name(self.small_gif, 'gif'))
 
     def test_create_post_guest_client(self):
         '''Не авторизованный пользователь не может создать пост.
@@ -172,7 +186,7 @@ class PostEditForm(TestCase):
         post = request.context.get('post')
         self.assertEqual(post.text, self.form_data['text'])
         self.assertEqual(post.group.id, self.form_data['group'])
-        self.assertEqual(post.image, 'posts/small.gif')
+        self.assertEqual(post.image, hashed_name(self.small_gif, 'gif'))
 
     def test_post_edit_authorized_user_alien_post(self):
         '''Авторизованный пользователь не может отредактировать чужой пост.'''
@@ -245,3 +259,119 @@ class PostCommentForm(TestCase):
         )
         obj = request.context['comments'][0]
         self.assertEqual(obj.text, self.form_data['text'])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self) -> None:
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.post = Post.objects.create(author=self.user, text='Без картинки')
+
+    def image(self, size, image_format='PNG', **options):
+        content = io.BytesIO()
+        Image.new('RGB', size, 'red').save(content, image_format, **options)
+        return content.getvalue()
+
+    def upload(self, content):
+        return self.authorized_client.post(
+            reverse('posts:post_edit', args=[self.post.pk]),
+            data={
+                'text': 'Большая картинка',
+                'image': SimpleUploadedFile(
+                    'big.png', content, content_type='image/png'
+                ),
+            }
+        )
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels(self):
+        '''Картинка с лишними пикселями отклоняется по заголовку'''
+        response = self.upload(self.image((20, 20)))
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 0 мегапикселей'
+        )
+        self.post.refresh_from_db()
+        self.assertFalse(self.post.image)
+
+    @override_settings(FILE_UPLOAD_MAX_SIZE=10)
+    def test_too_many_bytes(self):
+        '''Файл больше лимита не сохраняется'''
+        response = self.upload(self.image((20, 20)))
+        self.assertFormError(response, 'form', 'image', 'Файл больше 0 МБ')
+        self.post.refresh_from_db()
+        self.assertFalse(self.post.image)
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_reencode(self):
+        '''Перекодированная картинка меньше и без EXIF'''
+        exif = Image.Exif()
+        exif[0x010f] = 'Camera'
+        name = images.image_storage().save('posts/photo.png', ContentFile(
+            self.image((400, 200), exif=exif.tobytes())
+        ))
+        new_name = images.reencode(name)
+        self.assertTrue(new_name.endswith('.jpg'))
+        with images.image_storage().open(new_name) as file:
+            image = Image.open(file)
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (100, 50))
+            self.assertFalse(image.getexif())
+
+    def test_identical_uploads_share_file(self):
+        '''Одинаковые картинки хранятся одним файлом'''
+        content = self.image((30, 30))
+        posts = [
+            Post.objects.create(
+                author=self.user,
+                text='Одна и та же картинка',
+                image=SimpleUploadedFile(f'copy{i}.png', content),
+            )
+            for i in range(2)
+        ]
+        name = hashed_name(content, 'png')
+        self.assertEqual([post.image.name for post in posts], [name] * 2)
+        self.assertEqual(images.references()[name], 2)
+
+    def test_reencode_shared_file(self):
+        '''Перекодированная картинка достается всем постам с этим файлом'''
+        content = self.image((40, 40), 'PNG', compress_level=2)
+        posts = [
+            Post.objects.create(
+                author=self.user,
+                text='Общая картинка',
+                image=SimpleUploadedFile(f'shared{i}.png', content),
+            )
+            for i in range(2)
+        ]
+        name = thumbnails.process(posts[0].image.name, reencode=True)
+        self.assertTrue(name.endswith('.jpg'))
+        for post in posts:
+            post.refresh_from_db()
+            self.assertEqual(post.image.name, name)
+
+    def test_release_only_orphans(self):
+        '''Файл удаляется, только когда на него не ссылается ни один пост'''
+        content = self.image((30, 30), 'PNG', compress_level=1)
+        post = Post.objects.create(
+            author=self.user,
+            text='Картинка',
+            image=SimpleUploadedFile('orphan.png', content),
+        )
+        name = post.image.name
+        self.assertFalse(images.release(name))
+        post.delete()
+        path = images.image_storage().path(name)
+        os.utime(path, (0, 0))
+        call_command('cleanup_media', stdout=io.StringIO())
+        self.assertFalse(images.image_storage().exists(name))
@@ -1,7 +1,21 @@
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
 
-from posts.models import Group, Post
+from posts import page_cache
+from posts.counters import author_posts_count
+from posts.models import (
+    AuthorCounter, Comment, FeedItem, Group, Post, StaleSuggestions,
+)
+from posts.search import search
 
 
 User = get_user_model()
@@ -43,3 +57,269 @@ class PostModelTest(TestCase):
             with self.subTest(value=value):
                 self.assertEqual(
                     post._meta.get_field(value).verbose_name, expected)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='counter')
+        cls.group = Group.objects.create(
+            title='Первая группа',
+            slug='first',
+            description='Тестовое описание'
+        )
+        cls.other_group = Group.objects.create(
+            title='Вторая группа',
+            slug='second',
+            description='Тестовое описание'
+        )
+
+    def refresh(self, *objects):
+        for obj in objects:
+            obj.refresh_from_db()
+
+    def test_post_counters(self):
+        '''Счетчики постов автора и групп следуют за постами'''
+        post = Post.objects.create(
+            text='Тестовый текст поста',
+            author=self.user,
+            group=self.group
+        )
+        self.refresh(self.group, self.other_group)
+        self.assertEqual(author_posts_count(self.user), 1)
+        self.assertEqual(self.group.posts_count, 1)
+        post = Post.objects.get(pk=post.pk)
+        post.group = self.other_group
+        post.save()
+        self.refresh(self.group, self.other_group)
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+        post.delete()
+        self.refresh(self.other_group)
+        self.assertEqual(author_posts_count(
+            User.objects.get(pk=self.user.pk)), 0)
+        self.assertEqual(self.other_group.posts_count, 0)
+
+    def test_comment_counter(self):
+        '''Счетчик комментариев поста'''
+        post = Post.objects.create(text='Тестовый пост', author=self.user)
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Комментарий')
+        self.refresh(post)
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        self.refresh(post)
+        self.assertEqual(post.comments_count, 0)
+
+    def test_reconcile_counters(self):
+        '''reconcile_counters исправляет разошедшиеся счетчики'''
+        post = Post.objects.create(
+            text='Тестовый пост', author=self.user, group=self.group)
+        Post.objects.filter(pk=post.pk).update(comments_count=5)
+        Group.objects.filter(pk=self.group.pk).update(posts_count=7)
+        AuthorCounter.objects.all().delete()
+        call_command('reconcile_counters', stdout=StringIO())
+        self.refresh(post, self.group)
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(AuthorCounter.objects.get(
+            author=self.user).posts_count, 1)
+
+
+class CountersMigrationTest(TransactionTestCase):
+    '''Миграция 0009 заполняет счетчики по уже существующим данным'''
+    before = [('posts', '0008_post_pub_date_index')]
+    after = [('posts', '0009_counters')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        self.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def test_fill_counters(self):
+        apps = self.migrate(self.before)
+        author = apps.get_model('auth', 'User').objects.create(
+            username='migration_author'
+        )
+        group = apps.get_model('posts', 'Group').objects.create(
+            title='Группа', slug='migration', description=''
+        )
+        Post = apps.get_model('posts', 'Post')
+        posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=author, group=group
+            )
+            for i in range(3)
+        ]
+        Comment = apps.get_model('posts', 'Comment')
+        for i in range(2):
+            Comment.objects.create(
+                post=posts[0], author=author, text=f'Комментарий {i}'
+            )
+        apps = self.migrate(self.after)
+        self.assertEqual(apps.get_model('posts', 'AuthorCounter').objects.get(
+            author=author.pk).posts_count, 3)
+        self.assertEqual(apps.get_model('posts', 'Group').objects.get(
+            pk=group.pk).posts_count, 3)
+        self.assertEqual(apps.get_model('posts', 'Post').objects.get(
+            pk=posts[0].pk).comments_count, 2)
+
+
+class BulkImportTest(TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, content, opener=open):
+        path = os.path.join(self.directory, name)
+        with opener(path, 'wt', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def load(self, *args):
+        call_command('bulk_import', *args, stdout=StringIO())
+
+    def test_import_dumpdata_json(self):
+        '''Дамп как у dumpdata: даты, счетчики, ленты и поиск'''
+        user = {'username': 'leo', 'password': 'x', 'groups': [],
+                'date_joined': '2019-10-05T21:37:36Z'}
+        path = self.write('dump.json', json.dumps([
+            {'model': 'auth.permission', 'pk': 1, 'fields': {}},
+            {'model': 'auth.user', 'pk': 10, 'fields': user},
+            {'model': 'auth.user', 'pk': 11,
+             'fields': dict(user, username='reader')},
+            {'model': 'posts.group', 'pk': 5,
+             'fields': {'title': 'Дневники', 'slug': 'diaries',
+                        'description': ''}},
+            {'model': 'posts.post', 'pk': 7,
+             'fields': {'text': 'Начинаю новую тетрадь дневника',
+                        'pub_date': '1854-03-14T00:00:00Z',
+                        'author': 10, 'group': 5}},
+            {'model': 'posts.comment', 'pk': 1,
+             'fields': {'post': 7, 'author': 11, 'text': 'Читаю'}},
+            {'model': 'posts.follow', 'pk': 1,
+             'fields': {'user': 11, 'author': 10}},
+        ], ensure_ascii=False))
+        self.load(path)
+        post = Post.objects.get(pk=7)
+        self.assertEqual(post.pub_date.year, 1854)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(author_posts_count(post.author), 1)
+        self.assertEqual(Group.objects.get(pk=5).posts_count, 1)
+        self.assertTrue(FeedItem.objects.filter(user=11, post=7).exists())
+        self.assertTrue(StaleSuggestions.objects.filter(user=11).exists())
+        self.assertEqual(list(search(Post.objects.all(), 'тетрадь')), [post])
+
+    def test_import_refreshes_author_pages(self):
+        '''Профиль автора с импортированными постами пересобирается'''
+        author = User.objects.create_user(username='jsonl_author')
+        scope = page_cache.author_scope(author.pk)
+        before = page_cache.generation(scope)
+        path = self.write('posts.jsonl', json.dumps({
+            'model': 'posts.post', 'pk': 200,
+            'fields': {'text': 'Пост из JSON Lines', 'author': author.pk},
+        }, ensure_ascii=False) + '\n')
+        self.load(path)
+        self.assertNotEqual(page_cache.generation(scope), before)
+
+    def test_import_csv_gzip_with_deferred_indexes(self):
+        '''CSV читается в .gz, индексы и поиск восстанавливаются'''
+        author = User.objects.create_user(username='csv_author')
+        path = self.write(
+            'posts.csv.gz',
+            'id,text,author,group\n'
+            f'100,Первый пост из CSV,{author.pk},\n'
+            f'101,Второй пост из CSV,{author.pk},\n',
+            opener=gzip.open
+        )
+
+        def indexes():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT name FROM sqlite_master "
+                    "WHERE tbl_name = 'posts_post'"
+                )
+                return sorted(row[0] for row in cursor.fetchall())
+
+        before = indexes()
+        self.load(path, '--model', 'posts.post', '--defer-indexes',
+                  '--chunk', '1')
+        self.assertEqual(indexes(), before)
+        self.assertEqual(author_posts_count(author), 2)
+        self.assertIsNone(Post.objects.get(pk=100).group)
+        self.assertEqual(
+            [post.pk for post in search(Post.objects.all(), 'второй')],
+            [101]
+        )
+
+
+class GenerateDataTest(TestCase):
+    def generate(self):
+        call_command(
+            'generate_data', '--users', '5', '--groups', '2',
+            '--posts', '10', '--comments', '5', '--follows', '2',
+            '--images', '0', '--seed', '1', stdout=StringIO()
+        )
+
+    def test_refreshes_cached_pages(self):
+        '''После генерации главная и ленты групп пересобираются'''
+        before = page_cache.generation('index')
+        self.generate()
+        self.assertNotEqual(page_cache.generation('index'), before)
+        self.assertFalse(StaleSuggestions.objects.exists())
+
+    def test_repeated_runs(self):
+        '''Повторный запуск с тем же seed добавляет новые данные'''
+        models = (User, Group, Post)
+        before = [model.objects.count() for model in models]
+        groups = set(Group.objects.values_list('pk', flat=True))
+        self.generate()
+        self.generate()
+        self.assertEqual(
+            [model.objects.count() - count
+             for model, count in zip(models, before)],
+            [10, 4, 20]
+        )
+        self.assertTrue(all(
+            slug.startswith('group-')
+            for slug in Group.objects.exclude(pk__in=groups).values_list(
+                'slug', flat=True
+            )
+        ))
+
+
+class BenchCacheGuardTest(TestCase):
+    def test_refuses_to_clear_shared_cache(self):
+        '''Без DEBUG и --yes-clear-cache замеры не трогают кэш сайта'''
+        page_cache.bump('index')
+        version = page_cache.generation('index')
+        commands = [
+            ('bench_post_cards',),
+            ('bench_group_feed',),
+            ('bench_views', '--cold'),
+            ('bench_api', '--cold'),
+        ]
+        for args in commands:
+            with self.subTest(command=args[0]):
+                with self.assertRaisesMessage(
+                    CommandError, '--yes-clear-cache'
+                ):
+                    call_command(*args, stdout=StringIO())
+        self.assertEqual(page_cache.generation('index'), version)
+
+    def test_clears_cache_with_flag(self):
+        '''С явным согласием замер выполняется'''
+        out = StringIO()
+        call_command(
+            'bench_post_cards', '--repeat', '1', '--yes-clear-cache',
+            stdout=out
+        )
+        self.assertIn('Холодный кэш', out.getvalue())
@@ -1,10 +1,27 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from django import forms
 
-from posts.models import Group, Post, Follow
+from core.queries import QueryBudgetMixin, QueryRecorder
+from posts import cards, page_cache, thumbnails, trending
+from posts.models import Comment, Group, Post, Follow, TrendingScore
+from posts.signals import bump_post_pages
 
 User = get_user_model()
 
@@ -165,6 +182,51 @@ class PaginatorViewsTest(TestCase):
                     response.context['page_obj']
                 ), posts_count)
 
+    def test_cursor_pagination(self):
+        '''Курсоры ведут на следующую и предыдущую страницы'''
+        cache.clear()
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        first_page = self.client.get(url).context['page_obj']
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_next())
+        second_page = self.client.get(
+            url, {'cursor': first_page.next_cursor}).context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next())
+        self.assertFalse(set(first_page) & set(second_page))
+        back = self.client.get(
+            url, {'cursor': second_page.previous_cursor}).context['page_obj']
+        self.assertEqual(list(back), list(first_page))
+        self.assertFalse(back.has_previous())
+        last_page = self.client.get(
+            url, {'cursor': first_page.last_cursor}).context['page_obj']
+        self.assertEqual(list(last_page)[-1], list(second_page)[-1])
+
+    def test_invalid_cursor_returns_first_page(self):
+        '''Испорченный курсор открывает первую страницу'''
+        cache.clear()
+        response = self.client.get(reverse('posts:index'), {'cursor': '%%'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_page_out_of_range_returns_last_page(self):
+        '''Номер страницы за концом выборки открывает последнюю'''
+        cache.clear()
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'auth1'}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, {'page': 50})
+                self.assertEqual(response.status_code, 200)
+                page_obj = response.context['page_obj']
+                self.assertEqual(list(page_obj)[-1], self.post[0])
+                self.assertFalse(page_obj.has_next())
+                self.assertTrue(page_obj.has_previous())
+        response = self.client.get(reverse('posts:api_index'), {'page': 50})
+        self.assertEqual(response.status_code, 200)
+
 
 class CacheIndexPageTest(TestCase):
     @classmethod
@@ -178,16 +240,15 @@ class CacheIndexPageTest(TestCase):
         )
 
     def setUp(self) -> None:
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
     def test_cache_index_page(self):
         '''Проверка, работает ли кэш на главной странице'''
         response = self.authorized_client.get(reverse('posts:index')).content
-        Post.objects.create(
-            text='some text',
-            author=self.user
-        )
+        # изменение в обход сигналов не сбрасывает кэш
+        Post.objects.filter(pk=self.post.pk).update(text='другой текст')
         old_response = self.authorized_client.get(
             reverse('posts:index')).content
         self.assertEqual(old_response, response)
@@ -196,6 +257,189 @@ class CacheIndexPageTest(TestCase):
             reverse('posts:index')).content
         self.assertNotEqual(new_response, response)
 
+    def test_new_post_invalidates_index(self):
+        '''Новый пост сразу появляется на главной странице'''
+        self.authorized_client.get(reverse('posts:index'))
+        Post.objects.create(text='Свежий пост', author=self.user)
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(response['X-Feed-Cache'], 'miss')
+        self.assertContains(response, 'Свежий пост')
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(response['X-Feed-Cache'], 'hit')
+
+    def test_stale_while_revalidate(self):
+        '''Пока страницу пересобирает один запрос,
+           остальные получают предыдущую версию'''
+        url = reverse('posts:index')
+        response = self.authorized_client.get(url)
+        page_cache.bump('index')
+        # главная — общая оболочка personal_page
+        response.wsgi_request.page_shell = True
+        key = page_cache._page_key('index', response.wsgi_request)
+        cache.add(f'{key}:rebuild', 1)
+        stale = self.authorized_client.get(url)
+        self.assertEqual(stale['X-Feed-Cache'], 'stale')
+        self.assertEqual(stale.content, response.content)
+
+
+class PageShellCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Shell_author')
+        cls.first = User.objects.create_user(username='Shell_first')
+        cls.second = User.objects.create_user(username='Shell_second')
+        Post.objects.create(
+            text='Попытка <!--personal:header--> подмены', author=cls.author
+        )
+        Follow.objects.create(user=cls.first, author=cls.author)
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def get(self, user, url):
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        return client.get(url)
+
+    def test_one_copy_for_all_visitors(self):
+        '''Вошедшие и гости получают общую копию со своей шапкой'''
+        url = reverse('posts:index')
+        first = self.get(self.first, url)
+        self.assertEqual(first['X-Feed-Cache'], 'miss')
+        self.assertContains(first, 'Пользователь: Shell_first')
+        second = self.get(self.second, url)
+        self.assertEqual(second['X-Feed-Cache'], 'hit')
+        self.assertContains(second, 'Пользователь: Shell_second')
+        self.assertNotContains(second, 'Shell_first')
+        anonymous = self.get(None, url)
+        self.assertEqual(anonymous['X-Feed-Cache'], 'hit')
+        self.assertContains(anonymous, 'Войти')
+        self.assertNotContains(anonymous, 'Пользователь:')
+        self.assertNotContains(anonymous, '<!--personal:')
+        self.assertContains(anonymous, '&lt;!--personal:header--&gt;')
+
+    def test_page_without_shell_cached_per_visitor(self):
+        '''Без personal_page общая копия не отдается другим'''
+        @page_cache.cache_feed('index')
+        def view(request):
+            return HttpResponse(f'Пользователь: {request.user}')
+
+        factory = RequestFactory()
+        responses = []
+        for user in (self.first, self.second, AnonymousUser()):
+            request = factory.get('/')
+            request.user = user
+            responses.append(view(request))
+        self.assertEqual(
+            [response['X-Feed-Cache'] for response in responses],
+            ['miss'] * 3
+        )
+        self.assertNotContains(responses[1], 'Shell_first')
+        request = factory.get('/')
+        request.user = self.first
+        self.assertContains(view(request), 'Shell_first')
+
+    def test_failed_rebuild_releases_lock(self):
+        '''Ошибка при пересборке не оставляет страницу устаревшей'''
+        fail = []
+
+        @page_cache.cache_feed('index', shared=True)
+        def view(request):
+            if fail:
+                raise ValueError('Ошибка пересборки')
+            return HttpResponse('Страница')
+
+        request = RequestFactory().get('/')
+        view(request)
+        page_cache.bump('index')
+        fail.append(True)
+        with self.assertRaises(ValueError):
+            view(request)
+        fail.clear()
+        self.assertEqual(view(request)['X-Feed-Cache'], 'miss')
+
+    def test_follow_button_per_visitor(self):
+        '''Кнопка подписки в общей копии профиля своя у каждого'''
+        url = reverse('posts:profile', args=[self.author.username])
+        first = self.get(self.first, url)
+        self.assertTrue(first.context['following'])
+        self.assertContains(first, 'Отписаться')
+        second = self.get(self.second, url)
+        self.assertEqual(second['X-Feed-Cache'], 'hit')
+        self.assertFalse(second.context['following'])
+        self.assertContains(second, 'Подписаться')
+
+
+class GroupPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Group_cache_tester')
+        cls.first = Group.objects.create(title='Первая', slug='first')
+        cls.second = Group.objects.create(title='Вторая', slug='second')
+        cls.post = Post.objects.create(
+            text='Пост первой группы', author=cls.user, group=cls.first
+        )
+        Post.objects.create(text='Пост без группы', author=cls.user)
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def get(self, group):
+        return self.client.get(
+            reverse('posts:group_list', args=[group.slug])
+        )
+
+    def test_group_page_lists_only_group_posts(self):
+        '''На странице группы только ее посты'''
+        response = self.get(self.first)
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+        self.assertEqual(len(self.get(self.second).context['page_obj']), 0)
+
+    def test_post_invalidates_only_its_group(self):
+        '''Пост в группе сбрасывает кэш только ее страниц'''
+        self.get(self.first)
+        self.get(self.second)
+        Post.objects.create(
+            text='Новый пост второй группы', author=self.user,
+            group=self.second
+        )
+        self.assertEqual(self.get(self.first)['X-Feed-Cache'], 'hit')
+        response = self.get(self.second)
+        self.assertEqual(response['X-Feed-Cache'], 'miss')
+        self.assertContains(response, 'Новый пост второй группы')
+
+    def test_moved_post_invalidates_both_groups(self):
+        '''Перенос поста сбрасывает кэш старой и новой группы'''
+        self.get(self.first)
+        self.get(self.second)
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = self.second
+        post.save()
+        first = self.get(self.first)
+        self.assertEqual(first['X-Feed-Cache'], 'miss')
+        self.assertNotContains(first, 'Пост первой группы')
+        second = self.get(self.second)
+        self.assertEqual(second['X-Feed-Cache'], 'miss')
+        self.assertContains(second, 'Пост первой группы')
+
+    def test_renamed_group_drops_old_slug_pages(self):
+        '''После смены slug старые адреса группы больше не отдаются'''
+        urls = [
+            reverse('posts:group_list', args=['first']),
+            reverse('posts:api_group_posts', args=['first']),
+        ]
+        for url in urls:
+            self.client.get(url)
+        group = Group.objects.get(pk=self.first.pk)
+        group.slug = 'renamed'
+        group.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
 
 class FollowViewsTest(TestCase):
     cache.clear()
@@ -236,3 +480,628 @@ class FollowViewsTest(TestCase):
         context = response.context['page_obj']
         # Проверяем, нет ли постов автора
         self.assertEqual(len(context), 0)
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Card_author')
+        cls.group = Group.objects.create(
+            title='Группа карточек',
+            slug='cards',
+            description='Тестовое описание'
+        )
+        cls.post = Post.objects.create(
+            text='Исходный текст',
+            author=cls.user,
+            group=cls.group
+        )
+        cls.url = reverse('posts:group_list', kwargs={'slug': 'cards'})
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_card_cache_hits(self):
+        '''Повторная отрисовка страницы берет карточки из кэша'''
+        self.client.get(self.url)
+        self.assertEqual(cards.stats(), {'hits': 0, 'misses': 1})
+        # страница группы тоже кэшируется: заставляем ее пересобраться
+        page_cache.bump(page_cache.group_scope('cards'))
+        self.client.get(self.url)
+        self.assertEqual(cards.stats(), {'hits': 1, 'misses': 1})
+
+    def test_card_invalidated_on_changes(self):
+        '''Карточка обновляется при изменении поста, автора и группы'''
+        self.client.get(self.url)
+        self.post.text = 'Новый текст'
+        self.post.save()
+        self.assertContains(self.client.get(self.url), 'Новый текст')
+        self.user.first_name = 'Антон'
+        self.user.last_name = 'Чехов'
+        self.user.save()
+        self.assertContains(self.client.get(self.url), 'Антон Чехов')
+        self.group.slug = 'new-cards'
+        self.group.save()
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': 'new-cards'}))
+        self.assertContains(response, '/group/new-cards/')
+
+    def test_group_change_refreshes_pages(self):
+        '''Переименование группы сбрасывает главную и профиль автора'''
+        index = reverse('posts:index')
+        profile = reverse('posts:profile', args=[self.user.username])
+        for url in (index, profile):
+            self.client.get(url)
+        etag = self.client.get(index)['ETag']
+        self.group.slug = 'renamed-cards'
+        self.group.save()
+        response = self.client.get(index, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Feed-Cache'], 'miss')
+        for url in (index, profile):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, '/group/renamed-cards/')
+                self.assertNotContains(response, '/group/cards/')
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Thumb_author')
+        cls.group = Group.objects.create(
+            title='Группа картинок',
+            slug='thumbs',
+            description='Тестовое описание'
+        )
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x01\x00'
+            b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+            b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+            b'\x00\x00\x01\x00\x01\x00\x00\x02'
+            b'\x02\x4c\x01\x00\x3b'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост с картинкой {i}',
+                author=cls.user,
+                group=cls.group,
+                image=SimpleUploadedFile(
+                    name=f'thumb{i}.gif',
+                    content=small_gif,
+                    content_type='image/gif'
+                )
+            )
+            for i in range(3)
+        ]
+        cls.post = cls.posts[-1]
+        cls.url = reverse('posts:group_list', kwargs={'slug': 'thumbs'})
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_placeholder_until_thumbnail_ready(self):
+        '''Пока миниатюры нет, карточка показывает заглушку'''
+        self.assertContains(
+            self.client.get(self.url), 'placeholder.svg', count=3)
+        names = thumbnails.generate(self.post.image.name)
+        thumbnails.thumbnail_ready.send(
+            sender=None, post_id=self.post.pk, name=self.post.image.name
+        )
+        response = self.client.get(self.url)
+        self.assertContains(response, 'placeholder.svg', count=2)
+        self.assertContains(response, names[0])
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        self.assertContains(response, names[0])
+
+    def test_bump_post_pages_refreshes_feeds(self):
+        '''После pregenerate_thumbnails заглушку теряют и группа,
+           и профиль автора'''
+        urls = [
+            self.url,
+            reverse('posts:profile', args=[self.user.username]),
+        ]
+        for url in urls:
+            self.assertContains(self.client.get(url), 'placeholder.svg')
+        for post in self.posts:
+            thumbnails.generate(post.image.name)
+        bump_post_pages(*(post.pk for post in self.posts))
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotContains(self.client.get(url), 'placeholder.svg')
+
+    def test_thumbnails_read_once_per_page(self):
+        '''Миниатюры страницы читаются одним запросом'''
+        for post in self.posts:
+            thumbnails.generate(post.image.name)
+        cache.clear()
+        with QueryRecorder() as recorder:
+            response = self.client.get(self.url)
+        kvstore = [
+            sql for sql in recorder.statements if 'thumbnail_kvstore' in sql
+        ]
+        self.assertEqual(len(kvstore), 1)
+        self.assertNotContains(response, 'placeholder.svg')
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='Search_author', is_staff=True, is_superuser=True
+        )
+        cls.best = Post.objects.create(
+            text='Стихи, стихи и снова стихи', author=cls.user
+        )
+        cls.other = Post.objects.create(
+            text='Пушкин читал стихотворения', author=cls.user
+        )
+        cls.prose = Post.objects.create(text='Проза', author=cls.user)
+        cls.url = reverse('posts:search')
+
+    def test_search_ranked(self):
+        '''Поиск находит словоформы и ставит релевантные выше'''
+        response = self.client.get(self.url, {'q': 'стихами'})
+        self.assertEqual(
+            list(response.context['page_obj']), [self.best, self.other]
+        )
+
+    def test_search_follows_edits(self):
+        '''Индекс обновляется вместе с текстом поста'''
+        Post.objects.filter(pk=self.prose.pk).update(text='Проза и стих')
+        response = self.client.get(self.url, {'q': 'проза'})
+        self.assertEqual(list(response.context['page_obj']), [self.prose])
+        self.prose.delete()
+        response = self.client.get(self.url, {'q': 'проза'})
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_empty_query(self):
+        response = self.client.get(self.url, {'q': ' !? '})
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_admin_search(self):
+        '''Поиск в админке идет по индексу'''
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'Пушкина'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].queryset), [self.other]
+        )
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Budget_tester')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='budget',
+            description='Тестовое описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Тестовый текст поста {i}',
+                author=User.objects.create_user(username=f'budget_{i}'),
+                group=cls.group
+            )
+            for i in range(10)
+        ]
+        Follow.objects.create(user=cls.user, author=cls.posts[0].author)
+
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_index_query_count(self):
+        '''Главная страница укладывается в 3 запроса'''
+        with self.assertMaxQueries(3):
+            self.authorized_client.get(reverse('posts:index'))
+
+    def test_pages_within_budget(self):
+        '''Страницы не выходят за бюджет и не делают N+1'''
+        post = self.posts[0]
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'budget'}),
+            reverse('posts:profile', kwargs={'username': post.author}),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+            reverse('posts:post_comments', kwargs={'post_id': post.pk}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_create'),
+            reverse('posts:trending'),
+            reverse('posts:api_index'),
+            reverse('posts:api_group_posts', kwargs={'slug': 'budget'}),
+            reverse('posts:api_profile_posts',
+                    kwargs={'username': post.author}),
+            reverse('posts:api_follow'),
+            reverse('posts:api_post', kwargs={'post_id': post.pk}),
+            reverse('posts:api_post_batch') + '?ids=1,2,3',
+            reverse('posts:api_comments', kwargs={'post_id': post.pk}),
+            reverse('posts:api_group', kwargs={'slug': 'budget'}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+
+class PostCommentsTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Comments_author')
+        cls.post = Post.objects.create(
+            text='Обсуждаемый пост', author=cls.author
+        )
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text=f'Комментарий {i}'
+            )
+            for i in range(25)
+        ]
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_first_page_inline(self):
+        '''На странице поста только первые комментарии, новые сверху'''
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 20)
+        self.assertEqual(comments[0], self.comments[-1])
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, 'Комментарии: 25')
+        self.assertContains(response, comments.next_cursor)
+
+    def test_fragment_continues_by_cursor(self):
+        '''Фрагмент по курсору отдает оставшиеся комментарии'''
+        first = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        ).context['comments']
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk]),
+            {'cursor': first.next_cursor}
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertEqual(
+            list(response.context['comments']), self.comments[4::-1]
+        )
+        self.assertNotContains(response, 'Показать еще')
+
+    def test_fragment_links_next_page(self):
+        '''Фрагмент со следующими страницами ведет на продолжение'''
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.author, text='Еще')
+            for _ in range(20)
+        )
+        first = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        ).context['comments']
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk]),
+            {'cursor': first.next_cursor}
+        )
+        self.assertContains(response, 'Показать еще')
+        self.assertContains(
+            response, reverse('posts:post_comments', args=[self.post.pk])
+        )
+
+    def test_fragment_for_missing_post(self):
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk + 100])
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class TrendingTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Trending_author')
+        cls.quiet, cls.discussed = [
+            Post.objects.create(text=f'Пост {i}', author=cls.author)
+            for i in range(2)
+        ]
+
+    def top(self):
+        return list(trending.top_posts())
+
+    def test_comments_lift_post(self):
+        '''Обсуждаемый пост выше более нового, но тихого'''
+        quiet = Post.objects.create(text='Новый тихий', author=self.author)
+        for i in range(3):
+            Comment.objects.create(
+                post=self.discussed, author=self.author, text=f'Ответ {i}'
+            )
+        self.assertEqual(self.top()[0], self.discussed)
+        self.assertEqual(self.top()[1], quiet)
+        Comment.objects.filter(post=self.discussed).delete()
+        self.assertEqual(self.top()[0], quiet)
+
+    def test_old_activity_decays(self):
+        '''Событие трехдневной давности весит меньше свежего'''
+        now = timezone.now()
+        trending.add(self.quiet.pk, 5, now - timedelta(days=3))
+        trending.add(self.discussed.pk, 1, now)
+        self.assertEqual(self.top()[0], self.discussed)
+        # вес публикации и 5 / 2 ** 3 от события трехдневной давности
+        score = TrendingScore.objects.get(post=self.quiet).score
+        self.assertAlmostEqual(
+            trending.popularity(score, now), 1 + 5 / 8, delta=0.01
+        )
+
+    def test_compaction_matches_incremental(self):
+        '''Компакция дает тот же порядок и убирает остывшие посты'''
+        Comment.objects.create(
+            post=self.discussed, author=self.author, text='Ответ'
+        )
+        expected = self.top()
+        Post.objects.filter(pk=self.quiet.pk).update(
+            pub_date=timezone.now() - timedelta(days=30)
+        )
+        trending.compact()
+        self.assertEqual(
+            self.top(), [post for post in expected if post != self.quiet]
+        )
+
+    def test_trending_page_one_query(self):
+        '''Страница популярного читает рейтинг одним запросом'''
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('posts:trending'))
+        self.assertTemplateUsed(response, 'posts/trending.html')
+        self.assertEqual(list(response.context['posts']), self.top())
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Etag_author')
+        cls.reader = User.objects.create_user(username='Etag_reader')
+        cls.post = Post.objects.create(text='Пост с ETag', author=cls.author)
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def revalidate(self, client, url, response):
+        return client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_not_modified_without_rendering(self):
+        '''Неизмененная страница отвечает 304 без шаблонов'''
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', args=['Etag_author']),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('no-cache', response['Cache-Control'])
+                again = self.revalidate(self.client, url, response)
+                self.assertEqual(again.status_code, 304)
+                self.assertEqual(again.templates, [])
+                again = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                ) if response.has_header('Last-Modified') else again
+                self.assertEqual(again.status_code, 304)
+
+    def test_changes_invalidate_validators(self):
+        '''Новый пост, комментарий и подписка меняют ETag'''
+        index = reverse('posts:index')
+        detail = reverse('posts:post_detail', args=[self.post.pk])
+        profile = reverse('posts:profile', args=['Etag_author'])
+        responses = {
+            url: self.reader_client.get(url)
+            for url in (index, detail, profile)
+        }
+        Post.objects.create(text='Еще пост', author=self.author)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        for url, response in responses.items():
+            with self.subTest(url=url):
+                again = self.revalidate(self.reader_client, url, response)
+                self.assertEqual(again.status_code, 200)
+
+    def test_validator_depends_on_viewer(self):
+        '''Версия для гостя не подходит вошедшему пользователю'''
+        url = reverse('posts:index')
+        anonymous = self.client.get(url)
+        self.assertTrue(anonymous.has_header('Last-Modified'))
+        authorized = self.reader_client.get(url)
+        self.assertFalse(authorized.has_header('Last-Modified'))
+        self.assertNotEqual(anonymous['ETag'], authorized['ETag'])
+        again = self.revalidate(self.reader_client, url, anonymous)
+        self.assertEqual(again.status_code, 200)
+
+
+class ApiViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Api_author')
+        cls.group = Group.objects.create(title='API', slug='api')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост API {i}', author=cls.author, group=cls.group
+            )
+            for i in range(3)
+        ]
+        cls.comment = Comment.objects.create(
+            post=cls.posts[0], author=cls.author, text='Комментарий API'
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def get(self, name, data=None, **kwargs):
+        response = self.client.get(reverse(name, kwargs=kwargs), data)
+        return response.status_code, json.loads(response.content)
+
+    def test_feed_cursor_pages(self):
+        '''Ленты листаются по курсору до конца'''
+        pages = [
+            ('posts:api_index', {}),
+            ('posts:api_group_posts', {'slug': 'api'}),
+            ('posts:api_profile_posts', {'username': 'Api_author'}),
+        ]
+        for name, kwargs in pages:
+            with self.subTest(name=name):
+                status, first = self.get(name, {'limit': 2}, **kwargs)
+                self.assertEqual(status, 200)
+                self.assertEqual(
+                    [post['id'] for post in first['results']],
+                    [self.posts[2].pk, self.posts[1].pk]
+                )
+                self.assertEqual(first['results'][0]['author'], 'Api_author')
+                self.assertEqual(first['results'][0]['group'], 'api')
+                _, second = self.get(
+                    name, {'limit': 2, 'cursor': first['next']}, **kwargs
+                )
+                self.assertEqual(
+                    [post['id'] for post in second['results']],
+                    [self.posts[0].pk]
+                )
+                self.assertIsNone(second['next'])
+
+    def test_post_batch_keeps_order(self):
+        '''Пакет постов: порядок запроса и список отсутствующих'''
+        ids = f'{self.posts[1].pk},999999,{self.posts[0].pk}'
+        status, data = self.get('posts:api_post_batch', {'ids': ids})
+        self.assertEqual(
+            [post['id'] for post in data['results']],
+            [self.posts[1].pk, self.posts[0].pk]
+        )
+        self.assertEqual(data['missing'], [999999])
+        status, _ = self.get('posts:api_post_batch', {'ids': '1,a'})
+        self.assertEqual(status, 400)
+
+    def test_post_comments_and_group(self):
+        '''Пост, его комментарии и описание группы'''
+        post = self.posts[0]
+        _, data = self.get('posts:api_post', post_id=post.pk)
+        self.assertEqual(data['comments_count'], 1)
+        _, data = self.get('posts:api_comments', post_id=post.pk)
+        self.assertEqual(data['results'][0]['text'], 'Комментарий API')
+        _, data = self.get('posts:api_group', slug='api')
+        self.assertEqual(data['posts_count'], 3)
+        status, _ = self.get('posts:api_post', post_id=999999)
+        self.assertEqual(status, 404)
+
+    def test_follow_feed_requires_login(self):
+        '''Лента подписок API только для вошедших'''
+        status, _ = self.get('posts:api_follow')
+        self.assertEqual(status, 401)
+        reader = User.objects.create_user(username='Api_reader')
+        Follow.objects.create(user=reader, author=self.author)
+        self.client.force_login(reader)
+        _, data = self.get('posts:api_follow', {'limit': 2})
+        _, rest = self.get('posts:api_follow', {'cursor': data['next']})
+        self.assertEqual(
+            [post['id'] for post in data['results'] + rest['results']],
+            [post.pk for post in reversed(self.posts)]
+        )
+
+
+class ExportViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Export_author')
+        cls.other = User.objects.create_user(username='Export_other')
+        cls.staff = User.objects.create_user(
+            username='Export_staff', is_staff=True
+        )
+        cls.group = Group.objects.create(title='Выгрузка', slug='export')
+        cls.old = Post.objects.create(
+            text='Старый пост', author=cls.author, group=cls.group
+        )
+        Post.objects.filter(pk=cls.old.pk).update(
+            pub_date=cls.old.pub_date - timedelta(days=30)
+        )
+        cls.new = Post.objects.create(text='Новый пост', author=cls.author)
+        cls.comment = Comment.objects.create(
+            post=cls.new, author=cls.other, text='Комментарий'
+        )
+        cls.url = reverse('posts:export_author', args=['Export_author'])
+
+    def setUp(self) -> None:
+        self.client.force_login(self.author)
+
+    def records(self, response):
+        content = b''.join(response.streaming_content)
+        if response['Content-Type'] == 'application/gzip':
+            content = gzip.decompress(content)
+        return [json.loads(line) for line in content.decode().splitlines()]
+
+    def test_author_export_streams_posts_and_comments(self):
+        '''Выгрузка автора: посты от старых к новым, затем комментарии'''
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            [(row['model'], row['pk']) for row in self.records(response)],
+            [('posts.post', self.old.pk), ('posts.post', self.new.pk),
+             ('posts.comment', self.comment.pk)]
+        )
+
+    def test_export_gzip_and_since(self):
+        '''gzip на лету и продолжение выгрузки с отметки since'''
+        since = (self.new.pub_date - timedelta(days=1)).isoformat()
+        response = self.client.get(self.url, {'gzip': 1, 'since': since})
+        self.assertIn('.jsonl.gz', response['Content-Disposition'])
+        self.assertEqual(
+            [row['pk'] for row in self.records(response)],
+            [self.new.pk, self.comment.pk]
+        )
+        self.assertEqual(
+            self.client.get(self.url, {'since': 'вчера'}).status_code, 400
+        )
+
+    def test_export_permissions(self):
+        '''Чужие данные выгружает только персонал'''
+        group_url = reverse('posts:export_group', args=['export'])
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get(group_url).status_code, 403)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        response = self.client.get(group_url, {'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+
+    def test_csv_export_imports_back(self):
+        '''CSV из export_posts загружается обратно через bulk_import'''
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'author.csv.gz')
+        call_command('export_posts', '--author', 'Export_author',
+                     '--format', 'csv', '--gzip', '--output', path)
+        texts = dict(Post.objects.values_list('pk', 'text'))
+        Post.objects.all().delete()
+        call_command('bulk_import', path, stdout=StringIO())
+        self.assertEqual(dict(Post.objects.values_list('pk', 'text')), texts)
+        self.assertEqual(Post.objects.get(pk=self.old.pk).group, self.group)
+        self.assertTrue(Comment.objects.filter(pk=self.comment.pk).exists())
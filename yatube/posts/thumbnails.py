@@ -0,0 +1,175 @@
+"""Фоновая обработка картинок постов.
+
+Пост с новой картинкой после коммита ставит в очередь ее
+перекодирование (см. posts.images) и генерацию миниатюр всех размеров
+из settings.POST_THUMBNAIL_SIZES. Это делает пул процессов,
+запрос на это не тратит. Пока миниатюры нет, шаблоны
+показывают заглушку; когда она готова, отправляется сигнал
+thumbnail_ready, и закэшированные карточки и страницы пересобираются.
+"""
+import logging
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import Signal
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from core.workers import process_pool
+from posts import images
+from posts.models import Post
+
+
+logger = logging.getLogger(__name__)
+
+thumbnail_ready = Signal(providing_args=['post_id', 'name'])
+
+_executor = None
+
+
+def thumbnail_sizes():
+    return getattr(settings, 'POST_THUMBNAIL_SIZES', {
+        'card': ('960x339', {'crop': 'center', 'upscale': True}),
+    })
+
+
+def queue_timeout():
+    return getattr(settings, 'POST_THUMBNAIL_QUEUE_TIMEOUT', 60)
+
+
+def make_executor(workers=None):
+    return process_pool(
+        workers or getattr(settings, 'POST_THUMBNAIL_WORKERS', 2)
+    )
+
+
+def executor():
+    '''Общий пул процессов создается при первой задаче'''
+    global _executor
+    if _executor is None:
+        _executor = make_executor()
+    return _executor
+
+
+def thumbnail_file(name, size):
+    '''Миниатюра размера size без обращения к хранилищу.
+
+    Имя файла считается так же, как в ThumbnailBackend.get_thumbnail.
+    '''
+    geometry, options = thumbnail_sizes()[size]
+    backend = default.backend
+    source = ImageFile(name, images.image_storage())
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return ImageFile(
+        backend._get_thumbnail_filename(source, geometry, options),
+        default.storage
+    )
+
+
+def ready_many(names, size):
+    '''Готовые миниатюры для набора картинок: {name: ImageFile}.
+
+    Ключи key-value store sorl читаются одним get_many из кэша,
+    промахи — одним запросом к базе. В отличие от sorl отсутствие
+    миниатюры не кэшируется: ее в любой момент может дописать воркер.
+    '''
+    keys = {
+        add_prefix(thumbnail_file(name, size).key): name
+        for name in set(names) if name
+    }
+    if not keys:
+        return {}
+    kv_cache = default.kvstore.cache
+    values = {
+        key: value for key, value in kv_cache.get_many(keys).items()
+        if isinstance(value, str)
+    }
+    missing = [key for key in keys if key not in values]
+    if missing:
+        stored = dict(KVStore.objects.filter(
+            key__in=missing
+        ).values_list('key', 'value'))
+        if stored:
+            kv_cache.set_many(stored, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(stored)
+    return {
+        keys[key]: deserialize_image_file(value)
+        for key, value in values.items()
+    }
+
+
+def ready(name, size):
+    '''Готовая миниатюра или None'''
+    return ready_many([name], size).get(name)
+
+
+def generate(name):
+    '''Создает миниатюры всех размеров; выполняется в пуле'''
+    return [
+        get_thumbnail(
+            ImageFile(name, images.image_storage()), geometry, **options
+        ).name
+        for geometry, options in thumbnail_sizes().values()
+    ]
+
+
+def process(name, reencode=False):
+    '''Перекодирует новую картинку и создает миниатюры; выполняется в пуле.
+
+    Файлы картинок общие для постов с одинаковым содержимым, поэтому
+    перекодированная версия достается всем постам с этой картинкой.
+    Возвращает имя картинки с готовыми миниатюрами или None,
+    если ни у одного поста этой картинки уже нет.
+    '''
+    if reencode:
+        new_name = images.reencode(name)
+        fields = {'image': new_name}
+        if images.keep_originals():
+            fields['original'] = name
+        # без ссылки оригинал потом удалит cleanup_media
+        if not Post.objects.filter(image=name).update(**fields):
+            return None
+        name = new_name
+    generate(name)
+    return name
+
+
+def _done(name, future):
+    error = future.exception()
+    if error is not None:
+        logger.error('Картинка %s не обработана: %r', name, error)
+        return
+    result = future.result()
+    if result is None:
+        return
+    for post_id in Post.objects.filter(image=result).values_list(
+        'pk', flat=True
+    ):
+        thumbnail_ready.send(sender=None, post_id=post_id, name=result)
+
+
+def schedule(post_id, name, reencode=False):
+    '''Ставит обработку в очередь, если она еще не поставлена'''
+    # перекодирование ставится для каждого поста: пока работает задача
+    # первого, второй пост с той же картинкой мог ее еще не сохранить
+    key = f'thumb:queued:{name}:{post_id}' if reencode else (
+        f'thumb:queued:{name}'
+    )
+    if not cache.add(key, 1, queue_timeout()):
+        return None
+    future = executor().submit(process, name, reencode)
+    future.add_done_callback(partial(_done, name))
+    return future
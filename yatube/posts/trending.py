@@ -0,0 +1,131 @@
+"""Популярные посты с затуханием по времени.
+
+Публикация и комментарии добавляют посту вес, который со временем
+затухает вдвое за TRENDING_HALF_LIFE секунд. В TrendingScore хранится
+score = ln(сумма w * e^(t / tau)), где t — время события,
+а tau = TRENDING_HALF_LIFE / ln 2. Текущая популярность поста равна
+e^(score - now / tau), так что порядок по score — это порядок
+по популярности в любой момент: посты без новых событий
+не пересчитываются, а новое событие — один атомарный UPDATE.
+
+Команда compact_trending периодически пересчитывает score заново
+по событиям за TRENDING_WINDOW секунд и убирает остывшие посты,
+чтобы таблица не росла и не копила расхождения.
+"""
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Exp, Greatest, Least, Ln
+from django.utils import timezone
+
+from posts.models import Comment, Post, TrendingScore
+
+
+POST_WEIGHT = 1.0
+COMMENT_WEIGHT = 1.0
+# что остается от score, когда вычитается весь вклад
+MIN_SHARE = 1e-9
+
+
+def half_life():
+    return getattr(settings, 'TRENDING_HALF_LIFE', 24 * 60 * 60)
+
+
+def window():
+    return getattr(settings, 'TRENDING_WINDOW', 7 * 24 * 60 * 60)
+
+
+def trending_size():
+    return getattr(settings, 'TRENDING_POSTS', 20)
+
+
+def _tau():
+    return half_life() / math.log(2)
+
+
+def log_weight(weight, when):
+    '''Вклад события в score'''
+    return math.log(weight) + when.timestamp() / _tau()
+
+
+def _logaddexp(a, b):
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def _sql_logaddexp(field, value):
+    # ln(e^a + e^b) без переполнения: exp только от отрицательного
+    value = Value(value, output_field=FloatField())
+    high, low = Greatest(F(field), value), Least(F(field), value)
+    return high + Ln(1 + Exp(low - high))
+
+
+def _sql_logsubexp(field, value):
+    value = Value(value, output_field=FloatField())
+    share = 1 - Exp(Least(value - F(field), 0))
+    return F(field) + Ln(Greatest(share, MIN_SHARE))
+
+
+def add(post_id, weight, when):
+    '''Событие с весом weight в момент when поднимает пост'''
+    value = log_weight(weight, when)
+    scores = TrendingScore.objects.filter(post_id=post_id)
+    if scores.update(score=_sql_logaddexp('score', value)):
+        return
+    _, created = TrendingScore.objects.get_or_create(
+        post_id=post_id, defaults={'score': value}
+    )
+    if not created:
+        scores.update(score=_sql_logaddexp('score', value))
+
+
+def remove(post_id, weight, when):
+    '''Отменяет вклад удаленного события'''
+    TrendingScore.objects.filter(post_id=post_id).update(
+        score=_sql_logsubexp('score', log_weight(weight, when))
+    )
+
+
+def popularity(score, now=None):
+    '''Текущая популярность: сумма весов событий с затуханием'''
+    now = now or timezone.now()
+    return math.exp(score - now.timestamp() / _tau())
+
+
+def top_posts(limit=None):
+    '''Самые популярные посты: один запрос по индексу trending_score_idx'''
+    return Post.objects.filter(trending__isnull=False).select_related(
+        'author', 'group'
+    ).order_by('-trending__score')[:limit or trending_size()]
+
+
+def compact(now=None):
+    '''Пересчитывает таблицу по событиям окна; возвращает число постов'''
+    now = now or timezone.now()
+    since = now - timedelta(seconds=window())
+    events = [
+        (Post.objects.filter(pub_date__gte=since).values_list(
+            'pk', 'pub_date'
+        ), POST_WEIGHT),
+        (Comment.objects.filter(created__gte=since).values_list(
+            'post', 'created'
+        ), COMMENT_WEIGHT),
+    ]
+    scores = {}
+    with transaction.atomic():
+        for rows, weight in events:
+            for post_id, when in rows.iterator(chunk_size=10000):
+                value = log_weight(weight, when)
+                scores[post_id] = (
+                    _logaddexp(scores[post_id], value)
+                    if post_id in scores else value
+                )
+        TrendingScore.objects.all().delete()
+        TrendingScore.objects.bulk_create(
+            TrendingScore(post_id=post_id, score=score)
+            for post_id, score in scores.items()
+        )
+    return len(scores)
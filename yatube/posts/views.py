@@ -1,25 +1,49 @@
-from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.http import Http404, HttpResponseBadRequest
 from django.shortcuts import redirect, render, get_object_or_404
-from django.views.decorators.cache import cache_page
 
-from posts.models import Post, Group, User, Follow
+from core.paginator import CursorPaginator
+from posts import export, feed, follow_graph
+from posts.conditional import (
+    conditional_page, feed_etag, feed_last_modified, post_comments_etag,
+    post_detail_etag, profile_etag, profile_last_modified, profile_scope,
+)
+from posts.counters import author_posts_count
+from posts.fragments import personal_page
+from posts.page_cache import cache_feed
+from posts.search import search as search_posts
+from posts.trending import top_posts
+from posts.models import Comment, Post, Group, User, Follow
 from posts.forms import CommentForm, PostForm, CommentForm
 
 
 posts_on_page = 10
+comments_on_page = 20
+# порядок совпадает с индексом comment_post_created_idx
+comments_ordering = ('-created', '-id')
+
+
+def get_page(request, posts, **options):
+    '''Страница ленты по курсору ?cursor= (или по номеру ?page=)'''
+    paginator = CursorPaginator(posts, posts_on_page, **options)
+    return paginator.get_page(
+        request.GET.get('page'), request.GET.get('cursor')
+    )
 
 
-@cache_page(20)
+@conditional_page(feed_etag('index'), feed_last_modified('index'))
+@personal_page
+@cache_feed('index')
 def index(request):
     '''Функция главной страницы сайта
        Передает в posts/index.html запрос и словарь context
        Ограничивает кол-во постов на странице до 10
-       Подключена навигация с помощью пагинатора'''
-    posts = Post.objects.all()
-    paginator = Paginator(posts, posts_on_page)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+       Подключена навигация с помощью пагинатора
+       Страница кэшируется до публикации, правки или удаления поста'''
+    posts = Post.objects.select_related('author', 'group')
+    page_obj = get_page(request, posts)
     template = 'posts/index.html'
     context = {
         'page_obj': page_obj,
@@ -27,16 +51,21 @@ def index(request):
     return render(request, template, context)
 
 
+@conditional_page(
+    feed_etag('group:{slug}'), feed_last_modified('group:{slug}')
+)
+@personal_page
+@cache_feed('group:{slug}')
 def group_posts(request, slug):
     '''Функция страницы с групповыми
        Передает в posts/group_list.html запрос и словарь context
        Ограничивает кол-во постов на странице до 10
-       Подключена навигация с помощью пагинатора'''
+       Подключена навигация с помощью пагинатора
+       Посты группы читаются по индексу post_group_pub_date_idx,
+       страница кэшируется до изменений постов этой группы'''
     group = get_object_or_404(Group, slug=slug)
-    posts = Post.objects.all()
-    paginator = Paginator(posts, posts_on_page)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = group.group.select_related('author', 'group')
+    page_obj = get_page(request, posts)
     template = 'posts/group_list.html'
     context = {
         'group': group,
@@ -47,52 +76,76 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@conditional_page(profile_etag, profile_last_modified)
+@personal_page
+@cache_feed(profile_scope)
 def profile(request, username):
     '''Функция профиля автора
        Передает в posts/profile.html кол-во постов автора
        Подключена навигация с помощью пагинатора'''
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    paginator = Paginator(posts, posts_on_page)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    author = get_object_or_404(
+        User.objects.select_related('post_counter'), username=username
+    )
+    posts_count = author_posts_count(author)
+    posts = author.posts.select_related('author', 'group')
+    page_obj = get_page(request, posts)
     template = 'posts/profile.html'
-    following = None
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(user=request.user)
-        context = {
-            'author': author,
-            'posts_count': posts.count,
-            'page_obj': page_obj,
-            'following': following
-        }
-    else:
-        context = {
-            'author': author,
-            'posts_count': posts.count,
-            'page_obj': page_obj
-        }
+    context = {
+        'author': author,
+        'posts_count': posts_count,
+        'page_obj': page_obj,
+        'followers_count': follow_graph.followers_count(author),
+        'followees_count': follow_graph.followees_count(author),
+    }
     return render(request, template, context)
 
 
+@conditional_page(post_detail_etag)
 def post_detail(request, post_id):
     '''Функция одного отдельного поста
-       Передает в posts/post_detail.html пост и кол-во
-       постов автора'''
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.all().select_related('author')
+       Передает в posts/post_detail.html пост, кол-во
+       постов автора и первую страницу комментариев;
+       остальные догружаются с post_comments по курсору'''
+    post = get_object_or_404(
+        Post.objects.select_related('author__post_counter', 'group'),
+        pk=post_id
+    )
     form = CommentForm()
-    num_posts = Post.objects.filter(author__username=post.author)
     template = 'posts/post_detail.html'
     context = {
         'post': post,
-        'comments': comments,
+        'post_id': post.pk,
+        'comments': get_comments(post.pk),
         'form': form,
-        'num_posts': num_posts.count
+        'num_posts': author_posts_count(post.author)
     }
     return render(request, template, context)
 
 
+def get_comments(post_id, cursor=None):
+    '''Страница комментариев поста от новых к старым'''
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    )
+    paginator = CursorPaginator(
+        comments, comments_on_page, ordering=comments_ordering
+    )
+    return paginator.get_page(cursor=cursor)
+
+
+@conditional_page(post_comments_etag)
+def post_comments(request, post_id):
+    '''Фрагмент со следующей страницей комментариев поста
+       Курсор ?cursor= берется из ссылки «Показать еще»'''
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404('Пост не найден')
+    context = {
+        'post_id': post_id,
+        'comments': get_comments(post_id, request.GET.get('cursor')),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
 @login_required
 def post_create(request):
     '''Функция создания поста
@@ -162,11 +215,18 @@ def add_comment(request, post_id):
 
 
 @login_required
+@personal_page
+@cache_feed(feed.page_scope, version=feed.page_version)
 def follow_index(request):
-    posts = Post.objects.filter(author__folowwing__user=request.user)
-    paginator = Paginator(posts, posts_on_page)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    '''Лента подписок пользователя
+       Читается из материализованной ленты (posts.feed),
+       посты популярных авторов подмешиваются при чтении
+       Страницы кэшируются для каждого пользователя до подписки,
+       отписки или нового поста, правки у его авторов'''
+    posts = feed.follow_feed(request.user)
+    # feed_post уже делает порядок строгим: лишний pk в ORDER BY
+    # не дал бы читать ленту по индексу без сортировки
+    page_obj = get_page(request, posts, unique_keys=feed.FEED_UNIQUE_KEYS)
     # информация о текущем пользователе доступна в переменной request.user
     # ...
     context = {'page_obj': page_obj}
@@ -176,7 +236,7 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.create(user=request.user, author=author)
+    Follow.objects.get_or_create(user=request.user, author=author)
     return redirect('posts:follow_index')
 
 
@@ -185,3 +245,75 @@ def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:follow_index')
+
+
+def trending(request):
+    '''Функция страницы популярных постов
+       Порядок — по недавним публикациям и комментариям
+       с затуханием (posts.trending), без пагинации'''
+    context = {
+        'posts': top_posts(),
+    }
+    return render(request, 'posts/trending.html', context)
+
+
+def search(request):
+    '''Функция страницы поиска по тексту постов
+       Запрос передается в ?q=, результаты упорядочены
+       по релевантности и разбиты на страницы по номеру ?page='''
+    query = request.GET.get('q', '').strip()
+    posts = search_posts(
+        Post.objects.select_related('author', 'group'), query
+    )
+    page_obj = Paginator(posts, posts_on_page).get_page(
+        request.GET.get('page')
+    )
+    context = {
+        'page_obj': page_obj,
+        'query': query,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def export_response(request, records, name):
+    '''Потоковая выгрузка с параметрами ?format=jsonl|csv,
+       ?gzip=1 и ?since=<дата или дата и время>'''
+    fmt = request.GET.get('format', 'jsonl')
+    if fmt not in export.FORMATS:
+        return HttpResponseBadRequest(f'Неизвестный формат: {fmt}')
+    since = request.GET.get('since')
+    if since:
+        try:
+            since = export.parse_since(since)
+        except ValueError as error:
+            return HttpResponseBadRequest(str(error))
+    compress = request.GET.get('gzip') in ('1', 'true')
+    return export.response(records(since or None), fmt, compress, name)
+
+
+@login_required
+def export_author(request, username):
+    '''Выгрузка постов автора и комментариев к ним
+       Доступна самому автору и персоналу'''
+    author = get_object_or_404(User, username=username)
+    if request.user != author and not request.user.is_staff:
+        raise PermissionDenied
+    return export_response(
+        request,
+        lambda since: export.author_records(author, since),
+        f'posts-{author.username}'
+    )
+
+
+@login_required
+def export_group(request, slug):
+    '''Выгрузка постов группы и комментариев к ним
+       Доступна только персоналу'''
+    if not request.user.is_staff:
+        raise PermissionDenied
+    group = get_object_or_404(Group, slug=slug)
+    return export_response(
+        request,
+        lambda since: export.group_records(group, since),
+        f'group-{group.slug}'
+    )
@@ -50,6 +50,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.queries.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -140,8 +141,90 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Кэш общий для всех воркеров: инвалидация из одного процесса
+# сразу видна остальным. В разработке (один процесс runserver)
+# его заменяет локальный LocMemCache
 CACHES = {
     'default': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'CULL_FREQUENCY': 3,
+        },
+    }
+}
+if DEBUG:
+    CACHES['default'] = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
-}
\ No newline at end of file
+
+# Посты авторов, у которых подписчиков больше этого числа,
+# не раскладываются по лентам, а подмешиваются при чтении
+FEED_FANOUT_LIMIT = 1000
+
+# Сколько рекомендаций «кого почитать» хранить на пользователя
+FOLLOW_SUGGESTIONS = 10
+
+# Популярные посты: вклад событий затухает вдвое за TRENDING_HALF_LIFE
+# секунд, compact_trending пересчитывает события за TRENDING_WINDOW
+TRENDING_HALF_LIFE = 24 * 60 * 60
+TRENDING_WINDOW = 7 * 24 * 60 * 60
+TRENDING_POSTS = 20
+
+
+# Сколько SQL-запросов может сделать страница (по имени URL).
+# В тестах превышение — ошибка, в работе — предупреждение в логе.
+# Замерено на данных generate_data по умолчанию: авторизованный
+# посетитель, холодный кэш, самые тяжелые пост, группа, автор и лента;
+# для форм — отправка с картинкой, для лент — номер страницы за концом
+QUERY_BUDGETS = {
+    'posts:index': 5,
+    'posts:group_list': 6,
+    'posts:profile': 11,
+    'posts:post_detail': 6,
+    'posts:post_comments': 5,
+    'posts:post_create': 19,
+    'posts:post_edit': 11,
+    'posts:add_comment': 6,
+    'posts:follow_index': 8,
+    'posts:profile_follow': 12,
+    'posts:profile_unfollow': 8,
+    'posts:search': 5,
+    'posts:trending': 6,
+    'posts:api_index': 2,
+    'posts:api_group_posts': 3,
+    'posts:api_profile_posts': 2,
+    'posts:api_follow': 4,
+    'posts:api_post': 1,
+    'posts:api_post_batch': 1,
+    'posts:api_comments': 2,
+    'posts:api_group': 1,
+}
+QUERY_BUDGET_STRICT = False
+# в тестах превышение бюджета — ошибка
+TEST_RUNNER = 'core.queries.QueryBudgetRunner'
+# Одна и та же форма запроса столько раз за страницу — это N+1
+QUERY_N_PLUS_ONE_THRESHOLD = 5
+
+# Миниатюры этих размеров готовятся заранее в пуле процессов
+POST_THUMBNAIL_SIZES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+POST_THUMBNAIL_WORKERS = 2
+
+# Загрузки пишутся во временный файл и обрываются после лимита
+FILE_UPLOAD_HANDLERS = ['core.uploads.LimitedUploadHandler']
+FILE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+
+# Картинки постов перекодируются в фоне: без EXIF,
+# длинная сторона не больше POST_IMAGE_MAX_SIDE
+POST_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+POST_IMAGE_MAX_SIDE = 1920
+POST_IMAGE_FORMAT = 'JPEG'
+POST_IMAGE_QUALITY = 85
+POST_IMAGE_KEEP_ORIGINALS = False
+# cleanup_media не удаляет файлы моложе этого (секунды): ссылка
+# на только что сохраненный файл может быть еще не закоммичена
+MEDIA_ORPHAN_MIN_AGE = 60 * 60